@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+
+"""
+    seeded generator of lem-in maps with valid solutions of any size:
+    rooms are laid out on a grid, at random or on a circle and linked to rooms near them,
+    ants go along vertex disjoint paths carved from start room to end room,
+    one ant enters every path on every step so no two ants are ever in the same room
+"""
+
+import math
+import argparse
+
+import numpy as np
+
+LAYOUTS = ['grid', 'random', 'circle']
+
+# map units between neighbour rooms
+ROOM_SPACING = 10
+
+# random layouts link every room to one of this many rooms next to it in spatial order
+LINK_WINDOW = 8
+
+
+def generate_input(rooms=10000, ants=1000, steps=100, path_length=20, link_density=1.5, layout='grid', seed=0):
+    """
+        map and solution text: rooms including start and end room,
+        link_density is number of links per room besides path links,
+        paths are path_length rooms long and there are as many as needed to finish in steps steps
+    """
+    if layout not in LAYOUTS:
+        raise ValueError(f"layout should be one of {', '.join(LAYOUTS)}, not {layout}")
+    if steps <= path_length + 1:
+        raise ValueError(f"steps should be more than path length + 1 ({path_length + 1})")
+
+    # one ant enters every path on every step: last ant departs on step steps - path_length - 1
+    number_of_paths = math.ceil(ants / (steps - path_length - 1))
+    if number_of_paths * path_length > rooms - 2:
+        raise ValueError(f"{number_of_paths} paths of {path_length} rooms do not fit in {rooms} rooms, "
+                         f"add rooms or steps")
+
+    rng = np.random.default_rng(seed)
+    coords = layout_coords(layout, rooms, rng)
+    link_array = local_links(layout, coords, link_density, rng)
+
+    paths = carve_paths(coords, number_of_paths, path_length, rng)
+    start_room, end_room = 0, rooms - 1
+    path_links = np.column_stack((
+        np.column_stack((np.full(number_of_paths, start_room), paths)).ravel(),
+        np.column_stack((paths, np.full(number_of_paths, end_room))).ravel()))
+    link_array = unique_links(np.concatenate((link_array, path_links)))
+
+    return map_text(ants, coords, link_array) + '\n' + solution_text(ants, paths, end_room)
+
+
+def layout_coords(layout, rooms, rng):
+    "integer x y of every room, room 0 is top left and the last room is bottom right"
+    side = math.ceil(math.sqrt(rooms))
+
+    if layout == 'grid':
+        ids = np.arange(rooms)
+        coords = np.column_stack((ids % side, ids // side)) * ROOM_SPACING
+    elif layout == 'random':
+        coords = rng.integers(0, side * ROOM_SPACING, size=(rooms, 2))
+    else:
+        angles = rng.uniform(0, 2 * math.pi, rooms)
+        radius = side * ROOM_SPACING / 2 * np.sqrt(rng.uniform(0.25, 1, rooms))
+        coords = np.column_stack((np.cos(angles), np.sin(angles))) * radius[:, None] + side * ROOM_SPACING / 2
+        coords = coords.astype(np.int64)
+
+    coords[0] = coords.min(axis=0)
+    coords[-1] = coords.max(axis=0)
+
+    return coords.astype(np.int64)
+
+
+def local_links(layout, coords, link_density, rng):
+    "about link_density links per room between rooms close to each other"
+    rooms = len(coords)
+
+    if layout == 'grid':
+        # right and down grid neighbours, each kept with probability making link density
+        side = math.ceil(math.sqrt(rooms))
+        ids = np.arange(rooms)
+        right = np.column_stack((ids, ids + 1))[(ids % side != side - 1) & (ids + 1 < rooms)]
+        down = np.column_stack((ids, ids + side))[ids + side < rooms]
+        candidates = np.concatenate((right, down))
+        keep = rng.random(len(candidates)) < min(link_density / 2, 1)
+        return candidates[keep]
+
+    # rooms ordered by cell rows are mostly near rooms next to them in that order
+    cell = ROOM_SPACING * 4
+    order = np.lexsort((coords[:, 0], coords[:, 1] // cell))
+    number_of_links = int(rooms * link_density)
+    from_positions = rng.integers(0, rooms, number_of_links)
+    to_positions = np.minimum(from_positions + rng.integers(1, LINK_WINDOW + 1, number_of_links), rooms - 1)
+
+    return np.column_stack((order[from_positions], order[to_positions]))
+
+
+def carve_paths(coords, number_of_paths, path_length, rng):
+    "paths x path_length room ids, no room is in two paths, rooms go from start side to end side"
+    inner_rooms = rng.permutation(np.arange(1, len(coords) - 1))[:number_of_paths * path_length]
+    paths = inner_rooms.reshape(number_of_paths, path_length)
+
+    # ordered along start to end diagonal so paths do not jump back and forth
+    progress = coords[paths].sum(axis=2)
+    return np.take_along_axis(paths, np.argsort(progress, axis=1), axis=1)
+
+
+def unique_links(link_array):
+    "links without self links and duplicates in either direction"
+    link_array = np.sort(link_array, axis=1)
+    link_array = link_array[link_array[:, 0] != link_array[:, 1]]
+    return np.unique(link_array, axis=0)
+
+
+def map_text(ants, coords, link_array):
+    rooms = len(coords)
+    room_lines = [f"r{room_id} {x} {y}" for room_id, (x, y) in enumerate(coords.tolist())]
+    room_lines[0] = "##start\n" + room_lines[0]
+    room_lines[rooms - 1] = "##end\n" + room_lines[rooms - 1]
+    link_lines = [f"r{from_id}-r{to_id}" for from_id, to_id in link_array.tolist()]
+
+    return '\n'.join([str(ants)] + room_lines + link_lines) + '\n'
+
+
+def solution_text(ants, paths, end_room):
+    """
+        ant a goes along path a % paths and leaves start room on step a // paths + 1,
+        on every step each ant on its way moves one room further
+    """
+    number_of_paths, path_length = paths.shape
+    routes = np.column_stack((paths, np.full(number_of_paths, end_room)))  # rooms after start room
+    ant_ids = np.arange(ants)
+    ant_paths = ant_ids % number_of_paths
+    departures = ant_ids // number_of_paths + 1
+
+    lines = []
+    for step in range(1, int(departures[-1]) + path_length + 1):
+        # ants in first departure wave that are still on their way this step
+        first_ant = max(step - path_length - 1, 0) * number_of_paths
+        last_ant = min(step * number_of_paths, ants)
+        moving = ant_ids[first_ant:last_ant]
+        rooms = routes[ant_paths[moving], step - departures[moving]]
+        lines.append(' '.join(f"L{ant + 1}-r{room}" for ant, room in zip((moving).tolist(), rooms.tolist())))
+
+    return '\n'.join(lines) + '\n'
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="generate lem-in map and solution")
+    parser.add_argument('output', help="map and solution file to write")
+    parser.add_argument('--rooms', type=int, default=10000)
+    parser.add_argument('--ants', type=int, default=1000)
+    parser.add_argument('--steps', type=int, default=100, help="steps of solution, sets number of paths")
+    parser.add_argument('--path-length', type=int, default=20, help="rooms in every path besides start and end")
+    parser.add_argument('--link-density', type=float, default=1.5, help="links per room besides path links")
+    parser.add_argument('--layout', choices=LAYOUTS, default='grid')
+    parser.add_argument('--seed', type=int, default=0)
+
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    text = generate_input(args.rooms, args.ants, args.steps, args.path_length, args.link_density,
+                          args.layout, args.seed)
+
+    with open(args.output, 'w') as output_file:
+        output_file.write(text)
@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+
+"""
+    time and peak memory of every stage from input file to painted frame
+    on generated input of given size, results are written as json
+    and compared with results of an earlier run to catch regressions
+"""
+
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import tempfile
+import tracemalloc
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from generate_input import generate_input, LAYOUTS
+from lemin_vis.input_reader import read_input, extract_map_and_solution
+from lemin_vis.map_parser import parse_map_str
+from lemin_vis.solution_parser import parse_solution_str
+from lemin_vis.parallel_parser import parse_solution_parallel
+from lemin_vis.flow_analysis import turn_bound
+
+RESULTS_FORMAT_VERSION = 1
+
+SIZES = {
+    'small': dict(rooms=20000, ants=2000, steps=200, path_length=40),
+    'medium': dict(rooms=200000, ants=20000, steps=1000, path_length=100),
+    'large': dict(rooms=1000000, ants=100000, steps=2000, path_length=100),
+}
+
+# set_step calls timed, whole and in between steps
+SET_STEP_CALLS = 200
+
+FRAME_SIZE = (1280, 720)
+
+# results are kept next to this script, not in working directory
+DEFAULT_OUTPUT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmark_results.json')
+
+# stage slower than baseline by more than this part is reported as regression
+DEFAULT_TOLERANCE = 0.25
+
+
+def run_benchmarks(input_path, repeat=3, jobs=1):
+    "seconds (best of repeat) and traced peak memory of every stage, stages run in order"
+    results = {}
+    state = {}
+
+    def stage(name, function):
+        # memory is traced in a separate run, tracing slows down python code
+        tracemalloc.start()
+        state[name] = function()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        seconds = []
+        for _ in range(repeat):
+            begin = time.perf_counter()
+            function()
+            seconds.append(time.perf_counter() - begin)
+
+        results[name] = {'seconds': min(seconds), 'peak_mb': peak / 2 ** 20}
+
+    stage('read_input', lambda: extract_map_and_solution(read_input(input_path)))
+    map_data, solution_data = state['read_input']
+
+    stage('parse_map', lambda: parse_map_str(map_data))
+    map = state['parse_map']
+
+    stage('parse_solution', lambda: parse_solution_str(solution_data, map))
+    solution = state['parse_solution']
+
+    if jobs > 1:
+        # small benchmark inputs are under serial parse threshold
+        stage('parse_solution_parallel',
+              lambda: parse_solution_parallel(solution_data, map, jobs, report=None, min_bytes=0))
+
+    stage('turn_bound', lambda: turn_bound(map))
+
+    steps = np.random.default_rng(0).uniform(0, solution.number_of_steps - 1, SET_STEP_CALLS)
+    steps[::2] = np.floor(steps[::2])
+    stage('set_step', lambda: [solution.set_step(step) for step in steps.tolist()])
+    results['set_step']['seconds'] /= SET_STEP_CALLS
+
+    results.update(paint_benchmarks(map, solution, repeat))
+
+    return results
+
+
+def paint_benchmarks(map, solution, repeat):
+    "offscreen paint of the scene view paints: whole map, zoomed in on start room, from warm map tiles"
+    from lemin_vis.headless import gui_application
+    gui_application()
+
+    from PySide2.QtGui import QImage, QPainter
+    from PySide2.QtCore import QPointF
+    from lemin_vis.scene import Scene
+
+    results = {}
+    image = QImage(*FRAME_SIZE, QImage.Format_ARGB32)
+    solution.set_step(solution.number_of_steps / 2)
+
+    def paint(scene):
+        painter = QPainter(image)
+        scene.paint(painter)
+        painter.end()
+
+    def timed(name, function):
+        seconds = []
+        for _ in range(repeat):
+            begin = time.perf_counter()
+            function()
+            seconds.append(time.perf_counter() - begin)
+        results[name] = {'seconds': min(seconds)}
+
+    timed('create_scene', lambda: Scene(map, solution, image, 0))
+
+    scene = Scene(map, solution, image, 0)
+    paint(scene)  # band geometry and labels are built on first paint
+    timed('paint_whole_map', lambda: paint(scene))
+
+    scene.camera.zoom = 1
+    scene.camera.pos = -QPointF(*map.room_coords[map.start_index].tolist())
+    paint(scene)
+    timed('paint_zoomed_in', lambda: paint(scene))
+
+    tiled_scene = Scene(map, solution, image)
+    paint(tiled_scene)
+    timed('paint_from_tiles', lambda: paint(tiled_scene))
+
+    return results
+
+
+def environment():
+    import PySide2
+    return {
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'pyside2': PySide2.__version__,
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+    }
+
+
+def compare(results, baseline, tolerance):
+    "names of stages slower than in baseline by more than tolerance"
+    regressions = []
+
+    for name, result in results.items():
+        base = baseline.get('stages', {}).get(name)
+        if base and result['seconds'] > base['seconds'] * (1 + tolerance):
+            regressions.append(name)
+
+    return regressions
+
+
+def max_rss_mb():
+    "peak resident memory of this process, None where it is not reported"
+    try:
+        import resource
+    except ImportError:
+        return None
+
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def print_table(results, baseline=None):
+    for name, result in results.items():
+        line = f"{name:<26}{result['seconds'] * 1000:>12.3f} ms"
+        if 'peak_mb' in result:
+            line += f"{result['peak_mb']:>10.1f} MB"
+
+        base = (baseline or {}).get('stages', {}).get(name)
+        if base:
+            line += f"   x{result['seconds'] / max(base['seconds'], 1e-9):.2f} of baseline"
+        print(line)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="lemin42 visual benchmarks")
+    parser.add_argument('--size', choices=list(SIZES), default='small')
+    parser.add_argument('--rooms', type=int, help="override rooms of size preset")
+    parser.add_argument('--ants', type=int)
+    parser.add_argument('--steps', type=int)
+    parser.add_argument('--path-length', type=int)
+    parser.add_argument('--link-density', type=float, default=1.5)
+    parser.add_argument('--layout', choices=LAYOUTS, default='grid')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=3, help="timed runs of every stage, best is kept")
+    parser.add_argument('-j', '--jobs', type=int, default=1, help="also time parallel solution parse")
+    parser.add_argument('--output', default=DEFAULT_OUTPUT,
+                        help="json results file, benchmarks/benchmark_results.json by default")
+    parser.add_argument('--baseline', help="results of earlier run, slower stages are reported")
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE)
+
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = parse_args()
+
+    config = dict(SIZES[args.size], link_density=args.link_density, layout=args.layout, seed=args.seed)
+    for name in ['rooms', 'ants', 'steps', 'path_length']:
+        if getattr(args, name) is not None:
+            config[name] = getattr(args, name)
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        input_path = os.path.join(temp_dir, 'input.txt')
+
+        begin = time.perf_counter()
+        with open(input_path, 'w') as input_file:
+            input_file.write(generate_input(**config))
+        generate_seconds = time.perf_counter() - begin
+
+        stages = run_benchmarks(input_path, args.repeat, args.jobs)
+        input_size = os.path.getsize(input_path)
+
+    results = {
+        'version': RESULTS_FORMAT_VERSION,
+        'config': config,
+        'input_mb': input_size / 2 ** 20,
+        'generate_seconds': generate_seconds,
+        'environment': environment(),
+        'stages': stages,
+        'max_rss_mb': max_rss_mb(),
+    }
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            baseline = json.load(baseline_file)
+
+    print_table(stages, baseline)
+
+    with open(args.output, 'w') as output_file:
+        json.dump(results, output_file, indent=1)
+
+    if baseline:
+        regressions = compare(stages, baseline, args.tolerance)
+        if regressions:
+            print(f"slower than baseline by more than {args.tolerance:.0%}: {', '.join(regressions)}")
+            sys.exit(1)
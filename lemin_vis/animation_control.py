@@ -1,9 +1,25 @@
+import time
 from enum import Enum
 
 from PySide2.QtCore import QObject, Signal
 
+from lemin_vis.profiler import Profiler, profiled
+
 SimulationState = Enum('SimulationState', 'playing paused')
 
+# seconds at normal speed
+STEP_MOVE_TIME = 4 / 3  # ants go from room to room
+STEP_FREEZE_TIME = 1 / 3  # ants stay in rooms
+REWIND_TIME = 1 / 3  # one step rewind by keys
+
+SPEEDS = [0.25, 0.5, 1, 2, 4, 8, 16, 32, 64, 128, 256]
+
+# ants jump from room to room without movement from this speed on
+STEPS_ONLY_SPEED = 16
+
+# longer frames are not caught up e.g. when window was dragged
+MAX_FRAME_TIME = 1.0
+
 
 def clamp(v, smallest, largest):
     "limit value on both sides"
@@ -13,17 +29,37 @@ def clamp(v, smallest, largest):
 class AnimationControl(QObject):
     stepChanged = Signal(int)
     stateChanged = Signal(object)
+    speedChanged = Signal(float)
 
-    def __init__(self, solution, parent=None):
+    def __init__(self, solution, parent=None, profiler=None):
         super().__init__(parent)
 
         self.solution = solution
-        self.freeze_time = 0
+        self.profiler = profiler if profiler is not None else Profiler()
+        self.freeze_time = 0.0  # seconds left to stay in rooms
         self.current_action = self.play_action
         self.float_step = 0
         self._step = 0
         self.rewind_to_step = 0
 
+        # animation is driven by wall clock not by number of frames
+        self.last_time = time.monotonic()
+        self.speed_index = SPEEDS.index(1)
+        self.force_steps_only = False
+
+    @property
+    def speed(self):
+        return SPEEDS[self.speed_index]
+
+    @property
+    def steps_only(self):
+        "ants are shown in rooms only, movement between rooms is skipped"
+        return self.force_steps_only or self.speed >= STEPS_ONLY_SPEED
+
+    @property
+    def paused(self):
+        return self.current_action == self.pause_action
+
     @property
     def step(self):
         return self._step
@@ -38,10 +74,23 @@ class AnimationControl(QObject):
     def play_or_pause(self):
         if self.current_action == self.pause_action:
             self.current_action = self.play_action
+            self.last_time = time.monotonic()
             self.stateChanged.emit(SimulationState.playing)
         else:
             self.pause()
 
+    def speed_up(self):
+        self.speed_index = min(self.speed_index + 1, len(SPEEDS) - 1)
+        self.speedChanged.emit(self.speed)
+
+    def slow_down(self):
+        self.speed_index = max(self.speed_index - 1, 0)
+        self.speedChanged.emit(self.speed)
+
+    def toggle_steps_only(self):
+        self.force_steps_only = not self.force_steps_only
+        self.speedChanged.emit(self.speed)
+
     def pause(self):
         self.current_action = self.pause_action
         self.stateChanged.emit(SimulationState.paused)
@@ -53,6 +102,23 @@ class AnimationControl(QObject):
         if self.step < self.solution.number_of_steps - 1:
             self.current_action = self.rewind_forward_action
 
+    def goto_step(self, step):
+        "jump to any step at once, ants are placed to rooms from solution timeline row of that step"
+        if self.solution.error:
+            return
+
+        # stop running rewind, playback goes on from new step
+        if self.current_action != self.play_action and not self.paused:
+            self.pause()
+
+        step = clamp(int(step), 0, self.solution.number_of_steps - 1)
+        self.freeze_time = 0.0
+        self.float_step = step
+        self.set_solution_step(step)
+
+        if step != self.step:
+            self.step = step
+
     def rewind_backward(self):
         if self.solution.error:
             return
@@ -67,50 +133,86 @@ class AnimationControl(QObject):
 
             self.current_action = self.rewind_backward_action
 
+    @profiled('animation')
     def update(self):
+        "advance animation by wall time passed since previous update"
+        now = time.monotonic()
+        frame_time = min(now - self.last_time, MAX_FRAME_TIME)
+        self.last_time = now
+
         if self.solution.error:
             return
 
-        self.current_action()
+        self.current_action(frame_time)
 
     # private methods:
-    def play_action(self):
-        if self.freeze_time != 0:
-            self.freeze_time -= 1
-            return
+    @profiled('set_step')
+    def set_solution_step(self, step):
+        "place ants for float step"
+        self.solution.set_step(step)
+
+    def play_action(self, frame_time):
+        "frame time is spent on moving and staying in rooms, long frames may pass several steps"
+        time_left = frame_time * self.speed
+        step, float_step = self.step, self.float_step
+        number_of_steps = self.solution.number_of_steps
+
+        while time_left > 0:
+            if self.freeze_time > 0:
+                spent = min(time_left, self.freeze_time)
+                self.freeze_time -= spent
+                time_left -= spent
+                continue
+
+            # solution is still streamed in: wait on last received step
+            if not self.solution.complete and step + 1 > number_of_steps - 1:
+                break
+
+            # time to get to the next room, ants jump to it at once in steps only mode
+            if self.steps_only:
+                float_step = step
+                time_to_room = 0
+            else:
+                time_to_room = (step + 1 - float_step) * STEP_MOVE_TIME
 
-        self.float_step += 1/80
-        self.solution.set_step(self.float_step)
+            if time_left < time_to_room:
+                float_step += time_left / STEP_MOVE_TIME
+                break
 
-        # determinte integral step change eg 0.9 to 1.02
-        # to freeze for a little in rooms
-        if self.solution.ants_at_step(self.step + 1):
-            self.freeze_time = 20
-            self.step += 1
-            self.solution.set_step(self.step)
+            time_left -= time_to_room
+
+            # ants reached rooms of next step, freeze for a little in rooms
+            # or for the whole step time if they do not move
+            step += 1
+            float_step = step
+            self.freeze_time = STEP_MOVE_TIME + STEP_FREEZE_TIME if self.steps_only else STEP_FREEZE_TIME
+
+            if step > number_of_steps - 1:
+                step, float_step = 0, 0
+                self.solution.move_ants_to_start()
 
-        if self.step > self.solution.number_of_steps - 1:
-            self.solution.move_ants_to_start()
-            self.float_step = 0
-            self.step = 0
+        self.float_step = float_step
+        self.set_solution_step(float_step)
+        if step != self.step:
+            self.step = step
 
-    def pause_action(self):
+    def pause_action(self, frame_time):
         return
 
-    def rewind_forward_action(self):
-        self.float_step += 1/20
-        self.solution.set_step(self.float_step)
+    def rewind_forward_action(self, frame_time):
+        self.float_step += frame_time / REWIND_TIME
+        self.set_solution_step(self.float_step)
 
         if self.solution.ants_at_step(self.step + 1, +1):
             self.step += 1
-            self.solution.set_step(self.step)
+            self.set_solution_step(self.step)
             self.pause()
 
-    def rewind_backward_action(self):
-        self.float_step -= 1/20
-        self.solution.set_step(self.float_step)
+    def rewind_backward_action(self, frame_time):
+        self.float_step -= frame_time / REWIND_TIME
+        self.set_solution_step(self.float_step)
 
         if self.solution.ants_at_step(self.rewind_to_step, -1):
             self.step = self.rewind_to_step
-            self.solution.set_step(self.step)
+            self.set_solution_step(self.step)
             self.pause()
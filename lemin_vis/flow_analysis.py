@@ -0,0 +1,255 @@
+import math
+from dataclasses import dataclass, field
+from threading import Thread
+from concurrent.futures import Future
+
+import numpy as np
+
+
+@dataclass
+class TurnBound:
+    """
+        fewest turns a solution of map can take: ants go along at most number_of_paths
+        vertex disjoint start to end paths (max flow), none shorter than shortest_path links,
+        so no solution takes less than lower_bound turns,
+        paths are found max flow paths, ants along them take path_turns turns,
+        error tells why map has no bound
+    """
+    number_of_ants: int = 0
+    number_of_paths: int = 0
+    shortest_path: int = 0
+    lower_bound: int = 0
+    path_turns: int = 0
+    paths: list = field(default_factory=list)
+    error: str = None
+
+    def gap(self, number_of_turns):
+        "turns of solution above the lower bound"
+        return number_of_turns - self.lower_bound
+
+    def describe(self, number_of_turns=None):
+        if self.error:
+            return self.error
+        if self.number_of_ants == 0:
+            return "at least 0 turns: map has no ants to move"
+
+        text = (f"at least {self.lower_bound} turns: {self.number_of_paths} disjoint paths, "
+                f"shortest {self.shortest_path} links, {self.path_turns} turns along found paths")
+        if number_of_turns is not None:
+            text = f"{number_of_turns} turns, gap +{self.gap(number_of_turns)}, " + text
+
+        return text
+
+
+def turn_bound(map):
+    "max flow and turn bound of map, bound has error if map has no start or end room or they are not connected"
+    number_of_ants = map.number_of_ants
+    start, end = map.start_index, map.end_index
+
+    if start is None or end is None:
+        missing = "##start" if start is None else "##end"
+        return TurnBound(number_of_ants, error=f"TurnBoundError: map has no {missing} room")
+    if start == end:
+        return TurnBound(number_of_ants, error="TurnBoundError: start room is also end room")
+
+    # nothing to send, flow is not needed
+    if number_of_ants == 0:
+        return TurnBound()
+
+    link_array = map.link_array.astype(np.int64)
+
+    # ants go from start straight to end, all of them in one turn
+    if np.any((link_array.min(axis=1) == min(start, end)) & (link_array.max(axis=1) == max(start, end))):
+        return TurnBound(number_of_ants, number_of_ants, 1, min(number_of_ants, 1), min(number_of_ants, 1),
+                         [[start, end]])
+
+    graph = SplitGraph(map.number_of_rooms, link_array, start, end)
+    shortest_path = graph.max_flow(limit=number_of_ants)
+    if graph.flow == 0:
+        return TurnBound(number_of_ants, error="TurnBoundError: end room can not be reached from start room")
+
+    paths = graph.paths()
+    path_lengths = sorted(len(path) - 1 for path in paths)
+
+    return TurnBound(number_of_ants, graph.flow, shortest_path,
+                     shortest_path - 1 + math.ceil(number_of_ants / graph.flow),
+                     turns_along_paths(path_lengths, number_of_ants), paths)
+
+
+def turns_along_paths(path_lengths, number_of_ants):
+    """
+        fewest turns to send ants along paths of given lengths in links (sorted):
+        in T turns a path of L links takes T - L + 1 ants, shortest paths are used first
+    """
+    best = math.inf
+    links_sum = 0
+
+    for number_of_paths, length in enumerate(path_lengths, 1):
+        links_sum += length - 1
+        best = min(best, max(length, math.ceil((number_of_ants + links_sum) / number_of_paths)))
+
+    return best
+
+
+def turn_bound_in_background(map):
+    "turn bound computed in a daemon thread so the window does not wait for it, return future of it"
+    future = Future()
+
+    def run():
+        try:
+            future.set_result(turn_bound(map))
+        except Exception as ex:
+            future.set_exception(ex)
+
+    Thread(target=run, daemon=True).start()
+
+    return future
+
+
+class SplitGraph:
+    """
+        rooms split in two nodes: room in 2 * id and room out 2 * id + 1 joined by arc of capacity 1,
+        so at most one path goes through every room, every link is a pair of out -> in arcs,
+        arcs are stored by tail node (CSR) with residual capacity and reverse arc of each one,
+        Dinic max flow: levels are found by vectorized BFS, paths are walked on shortest path arcs only
+    """
+
+    def __init__(self, number_of_rooms, link_array, start, end):
+        # start and end rooms hold any number of ants, paths begin at start out and finish at end in
+        self.source = 2 * start + 1
+        self.sink = 2 * end
+        self.number_of_nodes = 2 * number_of_rooms
+        self.flow = 0
+
+        rooms = np.arange(number_of_rooms, dtype=np.int64)
+        rooms = rooms[(rooms != start) & (rooms != end)]
+        tails = np.concatenate((2 * rooms, 2 * link_array[:, 0] + 1, 2 * link_array[:, 1] + 1))
+        heads = np.concatenate((2 * rooms + 1, 2 * link_array[:, 1], 2 * link_array[:, 0]))
+
+        # arc 2i is forward arc i, arc 2i + 1 is its reverse with no capacity
+        arc_tails = np.column_stack((tails, heads)).ravel()
+        arc_heads = np.column_stack((heads, tails)).ravel()
+        order = np.argsort(arc_tails, kind='stable')
+        positions = np.empty_like(order)
+        positions[order] = np.arange(len(order))
+
+        self.tails = arc_tails[order]
+        self.heads = arc_heads[order]
+        self.reverse = positions[order ^ 1]
+        self.forward = order % 2 == 0
+        self.residual = self.forward.astype(np.int8)
+        self.offsets = np.searchsorted(self.tails, np.arange(self.number_of_nodes + 1))
+
+    def max_flow(self, limit):
+        "augment until there is no path or limit paths are found, return links in shortest path"
+        shortest_path = 0
+
+        while self.flow < limit:
+            source_levels = self.levels(self.source, self.sink, backward=False)
+            sink_level = source_levels[self.sink]
+            if sink_level < 0:
+                break
+
+            # start out -> room in -> room out ... -> end in
+            if self.flow == 0:
+                shortest_path = (int(sink_level) + 1) // 2
+
+            # arcs on shortest source to sink paths of residual graph
+            sink_levels = self.levels(self.sink, self.source, backward=True)
+            tail_levels = source_levels[self.tails]
+            head_levels = sink_levels[self.heads]
+            level_arcs = np.flatnonzero((self.residual > 0) & (tail_levels >= 0) & (head_levels >= 0) &
+                                        (tail_levels + 1 + head_levels == sink_level))
+
+            self.flow += self.blocking_flow(level_arcs, limit - self.flow)
+
+        return shortest_path
+
+    def levels(self, first, last, backward):
+        """
+            BFS distances in residual graph from first node until last node is reached, -1 if not reached,
+            backward BFS follows arcs into nodes: distances to first node
+        """
+        levels = np.full(self.number_of_nodes, -1, dtype=np.int64)
+        levels[first] = 0
+        frontier = np.array([first])
+        level = 0
+
+        while len(frontier) and levels[last] < 0:
+            level += 1
+
+            # all arcs of frontier nodes at once
+            starts = self.offsets[frontier]
+            counts = self.offsets[frontier + 1] - starts
+            arcs = np.repeat(starts - np.cumsum(counts) + counts, counts) + np.arange(counts.sum())
+
+            usable = self.residual[self.reverse[arcs] if backward else arcs] > 0
+            nodes = self.heads[arcs[usable]]
+            nodes = np.unique(nodes[levels[nodes] < 0])
+
+            levels[nodes] = level
+            frontier = nodes
+
+        return levels
+
+    def blocking_flow(self, level_arcs, limit):
+        "unit paths along level arcs until every source to sink path has a full arc, return their number"
+        residual, reverse = self.residual, self.reverse
+        arcs = level_arcs.tolist()
+        arc_heads = self.heads[level_arcs].tolist()
+        arc_tails = self.tails[level_arcs].tolist()
+
+        # next level arc of every node, arcs leading to dead ends are skipped
+        node_ends = dict(zip(arc_tails, range(1, len(arcs) + 1)))
+        pointers = {}
+        for index in range(len(arcs) - 1, -1, -1):
+            pointers[arc_tails[index]] = index
+
+        flow = 0
+        while flow < limit:
+            path = []
+            node = self.source
+
+            while node != self.sink:
+                index = pointers.get(node, 0)
+                end = node_ends.get(node, 0)
+                while index < end and residual[arcs[index]] == 0:
+                    index += 1
+                pointers[node] = index
+
+                if index < end:
+                    path.append(index)
+                    node = arc_heads[index]
+                elif path:
+                    # dead end: step back and skip arc into it
+                    node = arc_tails[path.pop()]
+                    pointers[node] += 1
+                else:
+                    return flow
+
+            for index in path:
+                residual[arcs[index]] -= 1
+                residual[reverse[arcs[index]]] += 1
+            flow += 1
+
+        return flow
+
+    def paths(self):
+        "room ids of every flow path from start room to end room"
+        # out -> in arcs with flow, room arcs go in -> out
+        flow_arcs = np.flatnonzero(self.forward & (self.residual == 0) & (self.tails % 2 == 1))
+        from_rooms = self.tails[flow_arcs] // 2
+        to_rooms = self.heads[flow_arcs] // 2
+
+        start, end = self.source // 2, self.sink // 2
+        next_rooms = dict(zip(from_rooms.tolist(), to_rooms.tolist()))
+
+        paths = []
+        for room in to_rooms[from_rooms == start].tolist():
+            path = [start, room]
+            while room != end:
+                room = next_rooms[room]
+                path.append(room)
+            paths.append(path)
+
+        return paths
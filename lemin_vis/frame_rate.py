@@ -0,0 +1,10 @@
+"""
+    frame rate settings of view, kept apart from Qt code
+    so command line defaults are read without loading Qt
+"""
+
+# frame rate limit of view while ants move or camera changes
+DEFAULT_MAX_FPS = 60
+
+# with adaptive frame rate at most this part of time is spent painting
+ADAPTIVE_PAINT_SHARE = 0.5
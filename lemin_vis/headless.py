@@ -0,0 +1,304 @@
+import os
+import sys
+import json
+import math
+import time
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from lemin_vis.tile_cache import DEFAULT_TILE_CACHE_MB
+
+DEFAULT_FRAME_SIZE = (1280, 720)
+
+# snapshot pyramid tiles, every level has twice the zoom of level above it
+SNAPSHOT_TILE_SIZE = 256
+
+# deepest pyramid level is at least this many pixels across unless zoom limit is reached
+SNAPSHOT_MIN_SIZE = 4096
+
+# default deepest level is zoomed out until it has at most this many tiles, about 1 gigapixel
+SNAPSHOT_MAX_TILES = 16384
+
+# pixels around map so rooms, labels and ant count badges at map sides are not cut
+SNAPSHOT_MARGIN = 48
+
+# vector export writes every room and link, larger maps are exported as tiles only
+SVG_MAX_ROOMS = 10000
+
+# scene and image of worker process, map and solution are inherited by forked workers
+_shared = {}
+
+# gui application outlives scenes painted with it
+_app = None
+
+
+def frame_steps(number_of_steps, frames_per_step=1, every=1, first_step=0, last_step=None):
+    """
+        float steps of exported frames: frames_per_step frames from every step to the next
+        (1 gives whole steps only), every Nth of those frames is kept
+    """
+    last_step = number_of_steps - 1 if last_step is None else min(last_step, number_of_steps - 1)
+    if last_step < first_step:
+        return np.zeros(0)
+
+    number_of_frames = (last_step - first_step) * frames_per_step + 1
+    steps = first_step + np.arange(number_of_frames) / frames_per_step
+
+    return steps[::every]
+
+
+def frame_path(out_dir, frame_index):
+    return os.path.join(out_dir, f"frame_{frame_index:06d}.png")
+
+
+def export_frames(map, solution, out_dir, steps, size=DEFAULT_FRAME_SIZE, jobs=1,
+                  tile_cache_mb=DEFAULT_TILE_CACHE_MB, report=sys.stderr):
+    """
+        render frames of given float steps to numbered png files in out_dir without a window,
+        frames are split into contiguous runs rendered by a pool of jobs processes,
+        every process paints its own offscreen image so only file names go back
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    begin_time = time.perf_counter()
+
+    tasks = [(step, frame_path(out_dir, index)) for index, step in enumerate(np.asarray(steps).tolist())]
+    paths, number_of_runs = run_renderer(map, solution, tasks, render_frames, size, jobs, tile_cache_mb)
+
+    if report:
+        export_time = time.perf_counter() - begin_time
+        print(f"exported {len(paths)} frames {size[0]}x{size[1]} to {out_dir}: "
+              f"{export_time:.3f} s, {number_of_runs} jobs", file=report)
+
+    return paths
+
+
+def export_snapshot(map, solution, out_dir, step, max_zoom=None, jobs=1, report=sys.stderr):
+    """
+        one step of solution as a pyramid of png tiles out_dir/level/column_row.png:
+        level 0 is the whole map in one tile, every next level has twice the zoom,
+        tiles are written as soon as they are rendered by one tile sized image per process
+        so memory does not depend on output size, pyramid.json describes levels
+    """
+    levels = snapshot_levels(map, max_zoom)
+
+    if report:
+        number_of_tiles = sum(columns * rows for _, _, _, columns, rows in levels)
+        print(f"rendering {number_of_tiles} tiles in {len(levels)} levels, "
+              f"deepest level zoom {levels[-1][0]:g}", file=report)
+
+    os.makedirs(out_dir, exist_ok=True)
+    begin_time = time.perf_counter()
+
+    tasks = []
+    for level, (zoom, origin_x, origin_y, columns, rows) in enumerate(levels):
+        level_dir = os.path.join(out_dir, str(level))
+        os.makedirs(level_dir, exist_ok=True)
+
+        tasks.extend((step, zoom, origin_x - column * SNAPSHOT_TILE_SIZE, origin_y - row * SNAPSHOT_TILE_SIZE,
+                      os.path.join(level_dir, f"{column}_{row}.png"))
+                     for row in range(rows) for column in range(columns))
+
+    # tiles are drawn directly, cached tiles of view would only take memory
+    paths, number_of_runs = run_renderer(map, solution, tasks, render_tiles,
+                                         (SNAPSHOT_TILE_SIZE, SNAPSHOT_TILE_SIZE), jobs, 0)
+
+    with open(os.path.join(out_dir, 'pyramid.json'), 'w') as pyramid_file:
+        json.dump({
+            'step': step,
+            'tile_size': SNAPSHOT_TILE_SIZE,
+            'levels': [{'zoom': zoom, 'origin': [origin_x, origin_y], 'columns': columns, 'rows': rows}
+                       for zoom, origin_x, origin_y, columns, rows in levels],
+        }, pyramid_file, indent=1)
+
+    if report:
+        export_time = time.perf_counter() - begin_time
+        print(f"exported {len(paths)} tiles in {len(levels)} levels to {out_dir}: "
+              f"{export_time:.3f} s, {number_of_runs} jobs", file=report)
+
+    return paths
+
+
+def snapshot_levels(map, max_zoom=None):
+    """
+        (zoom, screen x y of map origin, columns, rows) of every pyramid level,
+        deepest level zoom is max_zoom or zoom making map SNAPSHOT_MIN_SIZE pixels across,
+        default zoom is at least 1 unless deepest level would have more than SNAPSHOT_MAX_TILES tiles
+    """
+    from lemin_vis.scene import MIN_ZOOM, MAX_ZOOM, clamp
+
+    left, top = map.room_coords.min(axis=0).tolist()
+    right, bottom = map.room_coords.max(axis=0).tolist()
+    extent = max(right - left, bottom - top, 1)
+
+    def level_tiles(zoom):
+        return (math.ceil(((right - left) * zoom + 2 * SNAPSHOT_MARGIN) / SNAPSHOT_TILE_SIZE) *
+                math.ceil(((bottom - top) * zoom + 2 * SNAPSHOT_MARGIN) / SNAPSHOT_TILE_SIZE))
+
+    if max_zoom is None:
+        max_zoom = max(SNAPSHOT_MIN_SIZE / extent, 1)
+
+        # maps with huge coordinates are not drawn at full room size
+        while max_zoom > SNAPSHOT_MIN_SIZE / extent and level_tiles(max_zoom) > SNAPSHOT_MAX_TILES:
+            max_zoom = max(max_zoom / 2, SNAPSHOT_MIN_SIZE / extent)
+    max_zoom = clamp(max_zoom, MIN_ZOOM, MAX_ZOOM)
+
+    # levels are added until the whole map fits in one tile
+    max_extent = extent * max_zoom / (SNAPSHOT_TILE_SIZE - 2 * SNAPSHOT_MARGIN)
+    number_of_levels = 1 + max(math.ceil(math.log2(max_extent)), 0)
+
+    levels = []
+    for level in range(number_of_levels):
+        zoom = max_zoom / 2 ** (number_of_levels - 1 - level)
+
+        # map origin on whole pixel like in view so tiles line up
+        origin_x = round(SNAPSHOT_MARGIN - zoom * left)
+        origin_y = round(SNAPSHOT_MARGIN - zoom * top)
+        columns = math.ceil(((right - left) * zoom + 2 * SNAPSHOT_MARGIN) / SNAPSHOT_TILE_SIZE)
+        rows = math.ceil(((bottom - top) * zoom + 2 * SNAPSHOT_MARGIN) / SNAPSHOT_TILE_SIZE)
+
+        levels.append((zoom, origin_x, origin_y, columns, rows))
+
+    return levels
+
+
+def export_svg(map, solution, path, step, size=DEFAULT_FRAME_SIZE):
+    """
+        vector image of one step, map fitted in size like in view,
+        meant for small maps: every room and link becomes an svg element
+    """
+    if map.number_of_rooms > SVG_MAX_ROOMS:
+        raise ValueError(f"map has {map.number_of_rooms} rooms, svg is written for maps up to {SVG_MAX_ROOMS} rooms")
+
+    gui_application()
+    from PySide2.QtGui import QPainter
+    from PySide2.QtCore import QSize, QRect
+    from PySide2.QtSvg import QSvgGenerator
+    from lemin_vis.scene import Scene
+
+    width, height = size
+    generator = QSvgGenerator()
+    generator.setFileName(path)
+    generator.setSize(QSize(width, height))
+    generator.setViewBox(QRect(0, 0, width, height))
+    generator.setTitle("lemin42 visual")
+
+    # drawn directly, cached tiles would be embedded as pixmaps
+    scene = Scene(map, solution, generator, 0)
+    solution.set_step(step)
+
+    painter = QPainter(generator)
+    scene.paint(painter)
+    painter.end()
+
+
+def run_renderer(map, solution, tasks, render, size, jobs, tile_cache_mb):
+    """
+        call render on contiguous runs of tasks in a pool of jobs processes or in this process,
+        return concatenated render results and number of runs
+    """
+    runs = [run.tolist() for run in np.array_split(np.arange(len(tasks)), max(min(jobs, len(tasks)), 1))]
+    runs = [[tasks[index] for index in run] for run in runs if run]
+
+    if jobs > 1 and len(runs) > 1:
+        # fork shares parsed solution with workers, other start methods get pickled copies
+        use_fork = 'fork' in multiprocessing.get_all_start_methods()
+        context = multiprocessing.get_context('fork' if use_fork else None)
+
+        _shared['map'], _shared['solution'] = map, solution
+        initargs = (None, None) if use_fork else (map, solution)
+
+        try:
+            with ProcessPoolExecutor(max_workers=len(runs), mp_context=context, initializer=init_renderer,
+                                     initargs=initargs + (size, tile_cache_mb)) as pool:
+                results = [result for run_results in pool.map(render, runs) for result in run_results]
+        finally:
+            _shared.clear()
+    else:
+        init_renderer(map, solution, size, tile_cache_mb)
+        try:
+            results = render(tasks)
+        finally:
+            _shared.clear()
+
+    return (results, len(runs))
+
+
+def gui_application():
+    "offscreen gui application, created once per process"
+    global _app
+    os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+    # gui part of Qt only, widgets are never imported
+    from PySide2.QtGui import QGuiApplication
+
+    if QGuiApplication.instance() is None:
+        _app = QGuiApplication([])
+
+
+def init_renderer(map, solution, size, tile_cache_mb):
+    "create scene painting into offscreen image of given size"
+    gui_application()
+    from PySide2.QtGui import QImage
+    from lemin_vis.scene import Scene
+
+    if map is None:
+        map, solution = _shared['map'], _shared['solution']
+
+    width, height = size
+    image = QImage(width, height, QImage.Format_ARGB32)
+    _shared['image'] = image
+    _shared['scene'] = Scene(map, solution, image, tile_cache_mb)
+
+
+def render_frames(tasks):
+    "render (float step, file path) tasks, return paths of written files"
+    scene = _shared['scene']
+    paths = []
+
+    for step, path in tasks:
+        scene.solution.set_step(step)
+        paths.append(save_scene(path))
+
+    return paths
+
+
+def render_tiles(tasks):
+    "render (step, zoom, screen x y of map origin, file path) tasks, return paths of written files"
+    from PySide2.QtCore import QPointF
+
+    scene = _shared['scene']
+    camera = scene.camera
+    center = scene.viewport.rect().center()
+    current_step = None
+    paths = []
+
+    for step, zoom, origin_x, origin_y, path in tasks:
+        if step != current_step:
+            scene.solution.set_step(step)
+            current_step = step
+
+        # camera placing map origin at given screen point
+        camera.zoom = zoom
+        camera.pos = QPointF((origin_x - center.x()) / zoom, (origin_y - center.y()) / zoom)
+
+        paths.append(save_scene(path))
+
+    return paths
+
+
+def save_scene(path):
+    "paint scene to image of this process and write it to png file"
+    from PySide2.QtGui import QPainter
+
+    scene, image = _shared['scene'], _shared['image']
+
+    painter = QPainter(image)
+    scene.paint(painter)
+    painter.end()
+
+    if not image.save(path, 'PNG'):
+        raise OSError(f"could not write image {path}")
+
+    return path
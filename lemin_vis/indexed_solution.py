@@ -0,0 +1,281 @@
+import tempfile
+from collections import OrderedDict
+
+import numpy as np
+
+from lemin_vis.path_trie import number_by_first_ant
+from lemin_vis.solution_parser import (CompactTimeline, create_solution, split_solution_moves, parse_solution_str,
+                                       solution_add_rooms)
+
+# bytes of solution parsed at once while building index
+INDEX_CHUNK_SIZE = 8 * 1024 * 1024
+
+# every keyframe holds rooms of all ants, steps in between are decoded from solution text
+KEYFRAME_INTERVAL = 64
+
+# decoded steps kept in memory
+STEP_WINDOW_SIZE = 32
+
+# multiplier of per-ant path hash, paths are grouped by hash and length and then checked room by room
+PATH_HASH_MULTIPLIER = np.uint64(0x9E3779B97F4A7C15)
+
+
+class IndexedTimeline:
+    """
+        steps x ants room table read from memory mapped solution text instead of being stored:
+        byte offset of every solution line and keyframes (rooms of all ants every few steps)
+        are built in one pass, a step is decoded from the closest keyframe or decoded step before it,
+        recently decoded steps are kept in a small LRU window
+    """
+
+    def __init__(self, solution_data, room_name_array, number_of_ants, line_starts, keyframes):
+        self.solution_data = solution_data
+        self.room_name_array = room_name_array
+        self.number_of_ants = number_of_ants
+        self.line_starts = line_starts  # byte offset of every line and end of data
+        self.keyframes = keyframes  # disk backed rooms of all ants on every KEYFRAME_INTERVAL step
+        self.rows = OrderedDict()  # step -> rooms of all ants
+
+    def __len__(self):
+        return len(self.line_starts)
+
+    def __getstate__(self):
+        "memory mapped text and keyframes are copied when sent to other processes"
+        state = self.__dict__.copy()
+        state['solution_data'] = bytes(self.solution_data)
+        state['keyframes'] = np.array(self.keyframes)
+        state['rows'] = OrderedDict()
+        return state
+
+    def __getitem__(self, step):
+        row = self.rows.get(step)
+        if row is not None:
+            self.rows.move_to_end(step)
+            return row
+
+        # continue from decoded step if there is one after closest keyframe
+        base_step = step - step % KEYFRAME_INTERVAL
+        decoded_steps = [decoded for decoded in self.rows if base_step < decoded < step]
+        if decoded_steps:
+            base_step = max(decoded_steps)
+            row = self.rows[base_step].copy()
+        else:
+            row = np.array(self.keyframes[base_step // KEYFRAME_INTERVAL])
+
+        # step n is solution line n - 1
+        moves = self.decode_lines(base_step, step)
+        apply_moves(row, moves, step - base_step)
+
+        self.rows[step] = row
+        if len(self.rows) > STEP_WINDOW_SIZE:
+            self.rows.popitem(last=False)
+
+        return row
+
+    def decode_lines(self, first_line, end_line):
+        "move table of lines [first end), steps are counted from 1 for the first line"
+        if first_line == end_line:
+            return np.zeros((0, 3), dtype=np.int32)
+
+        data = self.solution_data[self.line_starts[first_line]:self.line_starts[end_line]]
+        moves, _ = split_solution_moves(data, self.room_name_array, self.number_of_ants)
+
+        return moves
+
+
+def apply_moves(row, moves, number_of_steps):
+    "move ants step by step, moves are sorted by step"
+    move_steps, move_ants, move_rooms = moves.T
+    step_bounds = np.searchsorted(move_steps, np.arange(1, number_of_steps + 2))
+
+    for begin, end in zip(step_bounds[:-1].tolist(), step_bounds[1:].tolist()):
+        row[move_ants[begin:end]] = move_rooms[begin:end]
+
+
+def open_indexed_solution(solution_data, map):
+    """
+        low memory solution: timeline steps are decoded from solution text when shown,
+        memory used does not grow with number of steps,
+        solutions not in the common format are parsed as usual
+    """
+    number_of_ants = map.number_of_ants
+    if number_of_ants == 0 or len(solution_data) == 0:
+        return parse_solution_str(solution_data, map)
+
+    index = build_index(solution_data, map)
+    if index is None:
+        return parse_solution_str(solution_data, map)
+
+    line_starts, keyframes, path_hash, path_length, first_line, last_line, visited = index
+
+    solution = create_solution(map)
+
+    never_moved = np.flatnonzero(path_length == 0)
+    if len(never_moved):
+        raise Exception(f"ant L{never_moved[0] + 1} never leaves start room")
+
+    solution.timeline = IndexedTimeline(solution_data, map.room_name_array, number_of_ants,
+                                        line_starts, keyframes)
+    solution.number_of_steps = len(line_starts)
+    solution._paths, solution._ant_path_ids = shared_paths(solution, path_hash, path_length, first_line, last_line)
+
+    # ants with colliding path hashes got one path, such solution is parsed as usual
+    if not paths_match(solution.timeline, solution._paths, solution._ant_path_ids):
+        return parse_solution_str(solution_data, map)
+    solution.path_trie = None
+    solution.ant_departures = (first_line + 1).astype(np.int32)
+
+    # ants moving on every step from departure need no text decoding at all
+    if np.array_equal(last_line - first_line + 1, path_length):
+        solution.timeline = CompactTimeline(solution.paths, solution.ant_path_ids,
+                                            solution.ant_departures, solution.number_of_steps)
+
+    solution_add_rooms(solution, np.flatnonzero(visited), map)
+    solution.complete = True
+
+    return solution
+
+
+def build_index(solution_data, map):
+    """
+        one pass over solution in line aligned chunks: line offsets, keyframes,
+        per-ant path hash and length, first and last line of every ant and rooms visited,
+        None if solution can not be parsed by bulk parser
+    """
+    number_of_ants = map.number_of_ants
+    data = np.frombuffer(solution_data, dtype=np.uint8)
+
+    # current room of every ant
+    row = np.full(number_of_ants, map.start_index, dtype=np.int32)
+    keyframes_file = tempfile.TemporaryFile()
+    keyframes_file.write(row.tobytes())
+
+    path_hash = np.zeros(number_of_ants, dtype=np.uint64)
+    path_length = np.zeros(number_of_ants, dtype=np.int64)
+    first_line = np.zeros(number_of_ants, dtype=np.int64)
+    last_line = np.zeros(number_of_ants, dtype=np.int64)
+    visited = np.zeros(map.number_of_rooms, dtype=bool)
+
+    line_starts = [np.zeros(1, dtype=np.int64)]
+    number_of_lines = 0
+    chunk_begin = 0
+
+    while chunk_begin < len(data):
+        # chunk ends after the last line break in it
+        chunk_end = min(chunk_begin + INDEX_CHUNK_SIZE, len(data))
+        newlines = np.flatnonzero(data[chunk_begin:chunk_end] == ord('\n'))
+        if chunk_end < len(data) and len(newlines):
+            chunk_end = chunk_begin + newlines[-1] + 1
+        elif chunk_end < len(data):
+            chunk_end = len(data)
+            newlines = np.flatnonzero(data[chunk_begin:] == ord('\n'))
+
+        chunk = solution_data[chunk_begin:chunk_end]
+        result = split_solution_moves(chunk, map.room_name_array, number_of_ants)
+        if result is None:
+            return None
+
+        moves, chunk_lines = result
+        move_steps, move_ants, move_rooms = moves.T
+
+        # every line break starts next line, data end is the end of the last line
+        next_lines = newlines + chunk_begin + 1
+        line_starts.append(next_lines if chunk_end < len(data) or data[-1] == ord('\n')
+                           else np.append(next_lines, len(data)))
+
+        step_bounds = np.searchsorted(move_steps, np.arange(1, chunk_lines + 2))
+        for line in range(chunk_lines):
+            begin, end = step_bounds[line], step_bounds[line + 1]
+            ants, rooms = move_ants[begin:end], move_rooms[begin:end]
+            solution_line = number_of_lines + line  # line n of the whole solution is step n + 1
+
+            row[ants] = rooms
+            first_line[ants[path_length[ants] == 0]] = solution_line
+            last_line[ants] = solution_line
+            path_hash[ants] = path_hash[ants] * PATH_HASH_MULTIPLIER + rooms.astype(np.uint64) + np.uint64(1)
+            path_length[ants] += 1
+
+            if (solution_line + 1) % KEYFRAME_INTERVAL == 0:
+                keyframes_file.write(row.tobytes())
+
+        visited[move_rooms] = True
+        number_of_lines += chunk_lines
+        chunk_begin = chunk_end
+
+    keyframes_file.flush()
+    number_of_keyframes = number_of_lines // KEYFRAME_INTERVAL + 1
+    keyframes = np.memmap(keyframes_file, dtype=np.int32, mode='r', shape=(number_of_keyframes, number_of_ants))
+
+    return (np.concatenate(line_starts), keyframes, path_hash, path_length, first_line, last_line, visited)
+
+
+def shared_paths(solution, path_hash, path_length, first_line, last_line):
+    """
+        unique paths and path id of every ant, paths are told apart by hash and length,
+        rooms of every distinct path are decoded from lines of its first ant only
+    """
+    path_keys = np.column_stack((path_hash.view(np.int64), path_length))
+    _, first_ants, ant_path_ids = number_by_first_ant(path_keys)
+
+    # decode lines where first ants of paths move, overlapping line ranges are decoded once
+    path_rooms = {ant: [solution.start_room_index] for ant in first_ants.tolist()}
+    order = np.argsort(first_line[first_ants], kind='stable')
+    ranges = [(first_line[ant], last_line[ant] + 1, ant) for ant in first_ants[order].tolist()]
+
+    timeline = solution.timeline
+    range_begin, range_end, range_ants = None, None, []
+    for begin, end, ant in ranges + [(None, None, None)]:
+        if range_begin is not None and (begin is None or begin >= range_end):
+            moves = timeline.decode_lines(range_begin, range_end)
+            moves = moves[np.isin(moves[:, 1], range_ants)]
+            for move_ant, room in moves[:, 1:].tolist():
+                path_rooms[move_ant].append(room)
+            range_begin, range_end, range_ants = None, None, []
+
+        if begin is None:
+            break
+        if range_begin is None:
+            range_begin, range_end = begin, end
+        range_end = max(range_end, end)
+        range_ants.append(ant)
+
+    paths = [path_rooms[ant] for ant in first_ants.tolist()]
+
+    return (paths, ant_path_ids)
+
+
+def paths_match(timeline, paths, ant_path_ids):
+    """
+        second pass over solution in line aligned chunks: every move of every ant
+        goes to the next room of its shared path, paths of ants were only compared by hash
+    """
+    path_lengths = np.array([len(path) for path in paths], dtype=np.int64)
+    path_rooms = np.concatenate([np.asarray(path, dtype=np.int64) for path in paths])
+    ant_offsets = (np.cumsum(path_lengths) - path_lengths)[ant_path_ids]
+    ant_moves = np.zeros(len(ant_path_ids), dtype=np.int64)
+
+    line_starts = timeline.line_starts
+    number_of_lines = len(line_starts) - 1
+    chunk_lines = np.searchsorted(line_starts, np.arange(INDEX_CHUNK_SIZE, line_starts[-1], INDEX_CHUNK_SIZE))
+    chunk_bounds = np.unique(np.concatenate(([0], np.minimum(chunk_lines, number_of_lines), [number_of_lines])))
+
+    for first_line, end_line in zip(chunk_bounds[:-1].tolist(), chunk_bounds[1:].tolist()):
+        _, move_ants, move_rooms = timeline.decode_lines(first_line, end_line).T.astype(np.int64)
+
+        # number of every move among moves of its ant, moves are in line order
+        ant_order = np.argsort(move_ants, kind='stable')
+        ant_counts = np.bincount(move_ants, minlength=len(ant_moves))
+        ant_firsts = np.cumsum(ant_counts) - ant_counts
+        move_numbers = np.empty(len(move_ants), dtype=np.int64)
+        move_numbers[ant_order] = np.arange(len(move_ants)) - ant_firsts[move_ants[ant_order]]
+        move_numbers += ant_moves[move_ants]
+
+        # start room is the first room of every path
+        if np.any(move_numbers + 1 >= path_lengths[ant_path_ids[move_ants]]):
+            return False
+        if not np.array_equal(path_rooms[ant_offsets[move_ants] + move_numbers + 1], move_rooms):
+            return False
+
+        ant_moves += ant_counts
+
+    return True
@@ -0,0 +1,74 @@
+import re
+import sys
+import mmap
+from io import StringIO
+
+# solution starts with the first "L<ant>-<room>" line,
+# if there is no solution resolver is expected to print ERROR instead
+SOLUTION_BEGIN_RE = re.compile(rb'^L', re.MULTILINE)
+ERROR_BEGIN_RE = re.compile(rb'^ERROR', re.MULTILINE)
+
+# one line with its trailing "\n" or the last line of a buffer without "\n"
+# (same splitting rules as iterating over io.StringIO)
+LINE_RE = re.compile(rb'[^\n]*\n|[^\n]+')
+
+
+def read_input(filename=None):
+    """
+        read whole map-solution input as bytes-like buffer
+        file is memory mapped instead of being read so it is never copied
+        to process memory, stdin is read as a single bytes object
+    """
+    if filename is None:
+        return sys.stdin.buffer.read()
+
+    with open(filename, 'rb') as input_file:
+        try:
+            # mapping stays valid after file is closed
+            return mmap.mmap(input_file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # empty file can not be mapped
+            return b''
+
+
+def extract_map_and_solution(input_data):
+    "separates map data from solution data when given single map-solution buffer as input"
+    "return map and solution data as tuple of memoryviews into given buffer (no copy is made)"
+
+    # find solution begin or ERROR msg in given input
+    solution_begin = SOLUTION_BEGIN_RE.search(input_data)
+
+    if solution_begin is None:
+        solution_begin = ERROR_BEGIN_RE.search(input_data)
+
+    input_view = memoryview(input_data)
+    split_pos = solution_begin.start()
+
+    return (input_view[:split_pos], input_view[split_pos:])
+
+
+def iter_lines(data):
+    "iterate over lines of str or bytes-like buffer, lines are decoded to str"
+    if isinstance(data, str):
+        yield from StringIO(data)
+        return
+
+    for line_match in LINE_RE.finditer(data):
+        yield line_match.group().decode()
+
+
+def read_map_data(stream):
+    """
+        read map data from binary stream up to the solution begin (or ERROR msg)
+        without waiting for the rest of the input
+        return map data bytes and first solution line as tuple
+    """
+    map_lines = []
+
+    for line in stream:
+        if line.startswith(b'L') or line.startswith(b'ERROR'):
+            return (b''.join(map_lines), line.decode())
+
+        map_lines.append(line)
+
+    raise ValueError("solution begin not found in input")
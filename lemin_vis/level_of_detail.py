@@ -0,0 +1,182 @@
+import math
+
+import numpy as np
+
+from lemin_vis.map_parser import unique_links
+from lemin_vis.spatial_index import SpatialGrid
+
+# every next band is for 4 times smaller zoom, band 0 is full detail for zoom >= 1
+BAND_ZOOM_STEP = 4
+
+
+class DetailBand:
+    """
+        simplified map geometry for one zoom band:
+        points and links between them, links shorter than a pixel are dropped
+        and points closer than a pixel are merged,
+        rooms are replaced by centers of density cells
+    """
+
+    def __init__(self, points, link_array, room_cells):
+        self.points = points
+        self.link_array = link_array
+        self.room_cells = room_cells  # x y of every cell containing at least one room
+        self._spatial_index = None
+
+    @property
+    def spatial_index(self):
+        "built on first query, not needed while whole map is in view"
+        if self._spatial_index is None:
+            self._spatial_index = SpatialGrid(self.points, self.link_array)
+
+        return self._spatial_index
+
+    def room_cells_in_rect(self, left, top, right, bottom):
+        x, y = self.room_cells.T
+        return np.flatnonzero((x >= left) & (x <= right) & (y >= top) & (y <= bottom))
+
+
+class LevelOfDetail:
+    """
+        map geometry simplified for zoomed out views,
+        band geometry is built once on first use of the band
+    """
+
+    def __init__(self, room_coords, link_array, room_size):
+        self.room_coords = room_coords
+        self.link_array = link_array
+        self.room_size = room_size
+        self.bands = {}
+        self._merged_links = None
+
+    def band(self, zoom):
+        "band number for camera zoom"
+        if zoom >= 1:
+            return 0
+
+        return int(math.log(1 / zoom, BAND_ZOOM_STEP)) + 1
+
+    def pixel_size(self, band):
+        "map units in one pixel at the largest zoom of band"
+        return BAND_ZOOM_STEP ** (band - 1)
+
+    def detail_band(self, band):
+        detail_band = self.bands.get(band)
+        if detail_band is None:
+            detail_band = self.bands[band] = self.build_band(band)
+
+        return detail_band
+
+    @property
+    def merged_links(self):
+        if self._merged_links is None:
+            self._merged_links = merge_collinear_links(self.room_coords, self.link_array)
+
+        return self._merged_links
+
+    def build_band(self, band):
+        pixel = self.pixel_size(band)
+        coords = self.room_coords.astype(np.float64)
+        link_array = self.merged_links
+
+        # drop links shorter than a pixel
+        link_vectors = coords[link_array[:, 1]] - coords[link_array[:, 0]]
+        link_array = link_array[np.hypot(*link_vectors.T) >= pixel]
+
+        # rooms falling to the same pixel become one point
+        points, room_points = snap_to_grid(coords, pixel)
+        link_array = room_points[link_array]
+        link_array = unique_links(link_array[link_array[:, 0] != link_array[:, 1]])
+
+        # one room dot per density cell, rooms are drawn with zoom independent size
+        room_cells, _ = snap_to_grid(coords, pixel * self.room_size / 2)
+
+        return DetailBand(points, link_array.astype(np.int32), room_cells)
+
+
+def snap_to_grid(coords, cell_size):
+    """
+        round coordinates to grid nodes,
+        return coordinates of distinct nodes and node index of every coordinate
+    """
+    if len(coords) == 0:
+        return (np.zeros((0, 2)), np.zeros(0, dtype=np.int64))
+
+    cells = np.round(coords / cell_size).astype(np.int64)
+    cells_min = cells.min(axis=0)
+    cells -= cells_min
+
+    # cells compared as single 64 bit keys
+    height = int(cells[:, 1].max()) + 1
+    keys = cells[:, 0] * height + cells[:, 1]
+    unique_keys, node_index = np.unique(keys, return_inverse=True)
+
+    nodes = np.column_stack((unique_keys // height, unique_keys % height)) + cells_min
+
+    return (nodes * cell_size, node_index)
+
+
+def simplify_polyline(points, pixel):
+    "drop points falling to the same pixel as previous point, path ends are kept"
+    pixels = np.round(points / pixel)
+    keep = np.concatenate(([True], np.any(pixels[1:] != pixels[:-1], axis=1)))
+    keep[-1] = True
+
+    return points[keep]
+
+
+def merge_collinear_links(room_coords, link_array):
+    """
+        replace chains of links going through rooms on a straight line
+        by a single link between chain ends,
+        inner chain rooms are those with exactly two links lying on one line at both sides of room
+    """
+    if len(link_array) == 0:
+        return link_array
+
+    number_of_rooms = len(room_coords)
+    degree = np.bincount(link_array.ravel(), minlength=number_of_rooms)
+
+    # both neighbours of every room with two links
+    ends = np.concatenate((link_array, link_array[:, ::-1]))
+    ends = ends[degree[ends[:, 0]] == 2]
+    ends = ends[np.argsort(ends[:, 0], kind='stable')]
+    rooms, neighbours = ends[0::2, 0], ends[:, 1].reshape(-1, 2)
+
+    # room lies on a line between its neighbours
+    coords = room_coords.astype(np.int64)
+    to_first = coords[neighbours[:, 0]] - coords[rooms]
+    to_second = coords[neighbours[:, 1]] - coords[rooms]
+    cross = to_first[:, 0] * to_second[:, 1] - to_first[:, 1] * to_second[:, 0]
+    dot = (to_first * to_second).sum(axis=1)
+    inner = (cross == 0) & (dot < 0)
+
+    is_inner = np.zeros(number_of_rooms, dtype=bool)
+    is_inner[rooms[inner]] = True
+    if not is_inner.any():
+        return link_array
+
+    chain_links = is_inner[link_array[:, 0]] | is_inner[link_array[:, 1]]
+    room_neighbours = dict(zip(rooms[inner].tolist(), map(tuple, neighbours[inner].tolist())))
+    is_inner = is_inner.tolist()
+
+    # walk every chain from its outer ends
+    merged = []
+    for from_id, to_id in link_array[chain_links].tolist():
+        if is_inner[from_id]:
+            if is_inner[to_id]:
+                continue
+            from_id, to_id = to_id, from_id
+
+        previous, room = from_id, to_id
+        while is_inner[room]:
+            first, second = room_neighbours[room]
+            previous, room = room, (second if first == previous else first)
+
+        # chain is walked from both ends, keep one of them
+        if from_id < room:
+            merged.append((from_id, room))
+
+    merged = np.array(merged, dtype=link_array.dtype).reshape(-1, 2)
+
+    return unique_links(np.concatenate((link_array[~chain_links], merged)))
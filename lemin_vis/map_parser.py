@@ -1,8 +1,11 @@
-import itertools
+import re
 from dataclasses import dataclass
 from collections import namedtuple
 from enum import Enum
-from io import StringIO
+
+import numpy as np
+
+from lemin_vis.input_reader import iter_lines
 
 Coords = namedtuple("Coords", "x y")
 RoomType = Enum("RoomType", "start end")
@@ -31,79 +34,386 @@ class Link:
 
 
 class Map:
+    """
+        compact map model: rooms are numbered by integer ids in order of appearance,
+        per-room data and links are stored in contiguous arrays indexed by room id
+    """
+
     def __init__(self):
         self.number_of_ants: int = 0
-        self.rooms: dict = {}
-        self.links: list = []
-        self.start_room: Room = None
-        self.end_room: Room = None
+        self.room_names: list = []  # room id -> room name
+        self.room_ids: dict = {}  # room name -> room id
+        self.room_coords = np.zeros((0, 2), dtype=np.int32)  # room id -> x y
+        self.link_array = np.zeros((0, 2), dtype=np.int32)  # unique links as room id pairs
+        self.start_index: int = None
+        self.end_index: int = None
         self.error: str = None
 
+        self._rooms = None
+        self._links = None
+        self._room_name_array = None
+
+    @property
+    def number_of_rooms(self):
+        return len(self.room_names)
+
+    @property
+    def number_of_links(self):
+        return len(self.link_array)
+
+    @property
+    def room_name_array(self):
+        "room id -> encoded room name as numpy bytes array for vectorized lookups"
+        if self._room_name_array is None:
+            self._room_name_array = np.array([name.encode() for name in self.room_names], dtype=bytes)
+
+        return self._room_name_array
+
+    # compatibility layer: Room and Link objects are only created when asked for
+
+    @property
+    def rooms(self):
+        "room name -> Room dict"
+        if self._rooms is None:
+            room_types = {self.start_index: RoomType.start, self.end_index: RoomType.end}
+            self._rooms = {name: Room(name, Coords(x, y), room_types.get(room_id))
+                           for room_id, (name, (x, y))
+                           in enumerate(zip(self.room_names, self.room_coords.tolist()))}
+
+        return self._rooms
+
+    @property
+    def links(self):
+        "list of Link between Room objects"
+        if self._links is None:
+            rooms = list(self.rooms.values())
+            self._links = [Link(rooms[from_id], rooms[to_id])
+                           for from_id, to_id in self.link_array.tolist()]
+
+        return self._links
+
+    @property
+    def start_room(self):
+        return self.room(self.start_index)
+
+    @property
+    def end_room(self):
+        return self.room(self.end_index)
+
+    def room(self, room_id):
+        return None if room_id is None else self.rooms[self.room_names[room_id]]
+
+
+# bulk parser line patterns, every line of a section must match exactly one of them,
+# lines in any unusual format (extra spaces, "-" in commands etc.) are left to line parser
+ROOM_SECTION_LINE_RE = re.compile(
+    rb'^(?:'
+    rb'(##[^\n-]*?)'  # command: ##start ##end ...
+    rb'|([^\s#][^ \n]*) ([+-]?[0-9]+) ([+-]?[0-9]+)'  # room: name x y
+    rb'|#(?!#)[^\n]*'  # comment
+    rb'|[ \t]*'  # empty line
+    rb')\r?$', re.MULTILINE)
+
+# links section starts with first link line, room lines always contain spaces
+FIRST_LINK_LINE_RE = re.compile(rb'^[^\s#-][^\s-]*-[^\s-]+\r?$', re.MULTILINE)
+
+NEWLINE_RE = re.compile(rb'\n')
+
+# bytes not allowed in "from-to" lines, empty lines may have spaces and tabs only
+NOT_IN_LINK_LINE = np.frombuffer(b' \t\r\v\f', dtype=np.uint8)
+IN_EMPTY_LINE = np.frombuffer(b' \t', dtype=np.uint8)
+
+
+def parse_map_str(map_data):
+    "map_data is str or bytes-like buffer (e.g. memoryview of input)"
+    if isinstance(map_data, str):
+        map_data = map_data.encode()
+
+    map = parse_map_buffer(map_data)
+
+    # line parser handles unusual input and reports line of an error
+    if map is None:
+        map = parse_map_lines(iter_lines(map_data))
+
+    return map
 
-def parse_map_str(map_str):
-    map_buf = StringIO(map_str)
+
+def parse_map_buffer(map_data):
+    """
+        bulk map parser: room lines and link lines are classified and split
+        by one regex pass per section (plain "from-to" link lines are split by numpy),
+        link room names are resolved to room ids in one batch
+        return None if some line is not in the common format or is invalid,
+        line parser should be used then
+    """
     map = Map()
 
     # read 1st line: number of ants
-    map.number_of_ants = int(map_buf.readline())
+    ants_line_end = NEWLINE_RE.search(map_data)
+    rooms_begin = ants_line_end.end() if ants_line_end else len(map_data)
+
+    try:
+        map.number_of_ants = int(bytes(map_data[:rooms_begin]))
+    except ValueError:
+        return None
+
+    # split rest of the map into rooms and links sections
+    first_link_line = FIRST_LINK_LINE_RE.search(map_data, rooms_begin)
+    links_begin = first_link_line.start() if first_link_line else len(map_data)
+
+    room_section = map_data[rooms_begin:links_begin]
+    link_section = map_data[links_begin:]
+
+    # read room lines
+    room_rows = ROOM_SECTION_LINE_RE.findall(room_section)
+    if len(room_rows) != count_lines(room_section):
+        return None
+
+    names = []
+    coords = []
+    room_type = None
+
+    for command, name, x, y in room_rows:
+        # comment or empty line
+        if not command and not name:
+            continue
+
+        # ##start or ##end room
+        if command:
+            room_type = parse_command_line(command[2:].rstrip().decode())
+            continue
+
+        # store start and end rooms
+        if room_type == RoomType.start:
+            map.start_index = len(names)
+        if room_type == RoomType.end:
+            map.end_index = len(names)
+
+        names.append(name)
+        coords.append((x, y))
+        room_type = None
+
+    # redefined rooms are left to line parser
+    if len(set(names)) != len(names):
+        return None
+
+    room_coords = np.array(coords, dtype=bytes).astype(np.int64).reshape(-1, 2)
+    if np.any(room_coords != room_coords.astype(np.int32)):
+        return None
+
+    map.room_names = [name.decode() for name in names]
+    map._room_name_array = room_name_array = np.array(names, dtype=bytes)
+    map.room_ids = dict(zip(map.room_names, range(len(names))))
+    map.room_coords = room_coords.astype(np.int32)
+
+    # read link lines
+    link_names = split_link_lines(link_section)
+    if link_names is None:
+        return None
+
+    # resolve all link room names at once
+    link_ids = lookup_room_ids(link_names, room_name_array)
+    if link_ids is None:
+        return None
+
+    map.link_array = unique_links(link_ids.reshape(-1, 2))
+
+    return map
+
+
+def count_lines(data):
+    "number of lines in bytes-like buffer, last line may be empty"
+    return np.count_nonzero(np.frombuffer(data, dtype=np.uint8) == ord('\n')) + 1
+
+
+def split_link_lines(link_section):
+    """
+        vectorized split of links section: "from-to" lines, comments and empty lines,
+        lines may end with "\r\n", return array of room names of link lines: from, to, from, to ...
+        or None if some line is in other format (commands, spaces in links ...)
+    """
+    data = np.frombuffer(link_section, dtype=np.uint8)
+    if len(data) == 0:
+        return np.zeros(0, dtype='S1')
+
+    line_ends = np.flatnonzero(data == ord('\n'))
+    if data[-1] != ord('\n'):
+        line_ends = np.append(line_ends, len(data))
+    line_starts = np.append(0, line_ends[:-1] + 1)
+
+    # "\r" of "\r\n" line break is not part of line
+    line_ends = line_ends - ((line_ends > line_starts) & (data[line_ends - 1] == ord('\r')))
+
+    # comment lines start with "#", lines starting with "##" are commands
+    lengths = line_ends - line_starts
+    hashed = (lengths > 0) & (data[line_starts] == ord('#'))
+    if np.any(hashed & (lengths > 1) & (data[np.minimum(line_starts + 1, len(data) - 1)] == ord('#'))):
+        return None
+
+    # whitespace is rare, it is counted by positions instead of masks of every byte
+    spaces = np.flatnonzero(np.isin(data, IN_EMPTY_LINE))
+    empty = bytes_in_lines(spaces, line_starts, line_ends) == lengths
+    link_lines = ~hashed & ~empty
+
+    # no whitespace and exactly one "-" per link line with non empty room names around it
+    whitespace = np.flatnonzero(np.isin(data, NOT_IN_LINK_LINE))
+    if np.any(bytes_in_lines(whitespace, line_starts, line_ends)[link_lines]):
+        return None
+
+    dashes = np.flatnonzero(data == ord('-'))
+    if not np.all(bytes_in_lines(dashes, line_starts, line_ends)[link_lines] == 1):
+        return None
+
+    line_starts, line_ends = line_starts[link_lines], line_ends[link_lines]
+    dashes = dashes[np.searchsorted(dashes, line_starts)]
+    if not np.all((line_starts < dashes) & (dashes + 1 < line_ends)):
+        return None
+
+    name_starts = np.column_stack((line_starts, dashes + 1)).ravel()
+    name_ends = np.column_stack((dashes, line_ends)).ravel()
+
+    return gather_names(data, name_starts, name_ends)
+
+
+def bytes_in_lines(positions, line_starts, line_ends):
+    "number of given byte positions in every [start end) line"
+    lines = np.searchsorted(line_starts, positions, side='right') - 1
+    inside = positions < line_ends[lines]
+
+    return np.bincount(lines[inside], minlength=len(line_starts))
+
+
+def gather_names(data, starts, ends):
+    "copy [start end) byte ranges of data to fixed width bytes array"
+    lengths = ends - starts
+    width = max(int(lengths.max(initial=0)), 1)
+
+    columns = np.arange(width)
+    name_bytes = data[np.minimum(starts[:, None] + columns, len(data) - 1)]
+    name_bytes[columns >= lengths[:, None]] = 0
+
+    return name_bytes.view(f'S{width}').ravel()
+
+
+def lookup_room_ids(names, room_names):
+    "vectorized room name to room id lookup, return None if some name is unknown"
+    if len(names) == 0:
+        return np.zeros(0, dtype=np.int32)
+    if len(room_names) == 0:
+        return None
+
+    width = max(names.itemsize, room_names.itemsize)
+
+    # names up to 8 bytes are compared as integers
+    if width <= 8:
+        names = names.astype('S8').view(np.uint64)
+        room_names = room_names.astype('S8').view(np.uint64)
+    else:
+        names = names.astype(f'S{width}')
+        room_names = room_names.astype(f'S{width}')
+
+    # sort room names together with looked up names once,
+    # then map every unique name to room id
+    unique_names, inverse = np.unique(np.concatenate((room_names, names)), return_inverse=True)
+    number_of_rooms = len(room_names)
+
+    unique_name_ids = np.full(len(unique_names), -1, dtype=np.int32)
+    unique_name_ids[inverse[:number_of_rooms]] = np.arange(number_of_rooms, dtype=np.int32)
+
+    ids = unique_name_ids[inverse[number_of_rooms:]]
+    if np.any(ids < 0):
+        return None
+
+    return ids
+
+
+def parse_map_lines(map_lines):
+    map = Map()
+    room_ids = map.room_ids
+    room_names = map.room_names
+    room_coords = []
+    links = []
+
+    # read 1st line: number of ants
+    map_file_iter = iter(map_lines)
+    map.number_of_ants = parse_map_line(int, next(map_file_iter, ''), 1)
 
     # read "room" lines until first "link" line is encountered
-    map_file_iter = iter(map_buf)
+    # then read "link" lines
     room_type = None
+    reading_links = False
 
-    for room_line in map_file_iter:
+    for line_number, line in enumerate(map_file_iter, 2):
         # eliminate trailing "\n"
-        room_line = room_line.strip()
+        line = line.strip()
 
         # ignore empty line
-        if len(room_line) == 0:
+        if len(line) == 0:
             continue
 
         # ignore comment lines
-        if is_comment_line(room_line):
+        if is_comment_line(line):
             continue
 
-        # first "link" line read -> put it back and proceed to reading "link" rooms
-        if is_link_line(room_line):
-            # "put link line back to iterator"
-            map_file_iter = itertools.chain((room_line,), map_file_iter)
-            break
+        # first "link" line read -> proceed to reading "link" lines
+        if not reading_links and is_link_line(line):
+            reading_links = True
+
+        if reading_links:
+            # resolve link to room ids
+            links.append(parse_map_line(parse_link_line, line, line_number, room_ids))
+            continue
 
         # ##start or ##end room
-        if is_command_line(room_line):
-            room_type = parse_command_line(room_line)
+        if is_command_line(line):
+            room_type = parse_command_line(line[2:])
             continue
 
-        # create room and add to collection
-        room = parse_room_line(room_line, room_type)
-        map.rooms[room.name] = room
+        # intern room name to room id, redefined room keeps its id
+        room_name, x, y = parse_map_line(parse_room_line, line, line_number)
+        room_id = room_ids.setdefault(room_name, len(room_names))
+        if room_id == len(room_names):
+            room_names.append(room_name)
+            room_coords.append((x, y))
+        else:
+            room_coords[room_id] = (x, y)
 
         # store start and end rooms
         if room_type == RoomType.start:
-            map.start_room = room
+            map.start_index = room_id
         if room_type == RoomType.end:
-            map.end_room = room
+            map.end_index = room_id
 
         room_type = None
 
-    # read link lines
-    for link_line in map_file_iter:
-        # eliminate trailing "\n"
-        link_line = link_line.strip()
+    map.room_coords = np.array(room_coords, dtype=np.int32).reshape(-1, 2)
+    map.link_array = unique_links(np.array(links, dtype=np.int32).reshape(-1, 2))
 
-        # ignore empty line
-        if len(link_line) == 0:
-            continue
+    return map
 
-        # ignore comment lines
-        if is_comment_line(link_line):
-            continue
 
-        # create link and add to set collection
-        link = parse_link_line(link_line, map.rooms)
-        map.links.append(link)
+def parse_map_line(parse_function, line, line_number, *args):
+    "call line parse function, parse error is reported with line number"
+    try:
+        return parse_function(line, *args)
+    except Exception as ex:
+        raise ValueError(f"line {line_number}: {line.strip()!r}: {ex!r}") from ex
 
-    return map
+
+def unique_links(link_array):
+    "drop repeated links, straight and reverse links are the same link"
+    if len(link_array) == 0:
+        return link_array
+
+    # order room ids in every link so reverse links become equal
+    link_array = np.sort(link_array, axis=1)
+
+    # keep first occurrence of every link in original order,
+    # links are compared as single 64 bit keys
+    keys = link_array[:, 0].astype(np.int64) << 32 | link_array[:, 1]
+    _, first_index = np.unique(keys, return_index=True)
+
+    return link_array[np.sort(first_index)]
 
 
 def is_comment_line(line):
@@ -125,8 +435,8 @@ def is_command_line(line):
     return True if line.startswith('##') else False
 
 
-def parse_command_line(line):
-    type_str = line[2:]
+def parse_command_line(type_str):
+    "type_str is command line without leading ##"
     if type_str == 'start':
         return RoomType.start
     elif type_str == 'end':
@@ -135,18 +445,18 @@ def parse_command_line(line):
     return None
 
 
-def parse_room_line(line, room_type):
+def parse_room_line(line):
     data = line.split(' ')
     room_name = str(data[0])
     x = int(data[1])
     y = int(data[2])
 
-    return Room(room_name, Coords(x, y), room_type)
+    return (room_name, x, y)
 
 
-def parse_link_line(line, rooms):
+def parse_link_line(line, room_ids):
     data = line.split('-')
     from_room_name = str(data[0])
     to_room_name = str(data[1])
 
-    return Link(rooms[from_room_name], rooms[to_room_name])
+    return (room_ids[from_room_name], room_ids[to_room_name])
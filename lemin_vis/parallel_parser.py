@@ -0,0 +1,128 @@
+import sys
+import time
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from lemin_vis.input_reader import iter_lines
+from lemin_vis.solution_parser import split_solution_moves, build_solution, parse_solution_lines, parse_solution_str
+
+# solution buffer and read-only room name table used by worker processes,
+# set before workers are started: forked workers inherit them without copying
+_shared = {}
+
+# smaller solutions are parsed serially: bulk parser takes about 30 ms per megabyte,
+# starting workers and sending move tables back costs more than it saves below this size
+PARALLEL_PARSE_MIN_BYTES = 8 * 1024 * 1024
+
+
+def parse_solution_parallel(solution_data, map, jobs, report=sys.stderr, min_bytes=PARALLEL_PARSE_MIN_BYTES):
+    """
+        parse solution split into line aligned chunks in a pool of worker processes,
+        every chunk is parsed by bulk parser to move table with chunk local steps,
+        tables are then merged with step offsets of their chunks,
+        solutions smaller than min_bytes are parsed serially,
+        parse time and estimated speedup over serial parsing are printed to report
+    """
+    if isinstance(solution_data, str):
+        solution_data = solution_data.encode()
+
+    if len(solution_data) < min_bytes:
+        return parse_solution_str(solution_data, map)
+
+    parse_begin = time.perf_counter()
+
+    chunks = split_chunks(solution_data, jobs)
+    if len(chunks) < 2:
+        return parse_solution_str(solution_data, map)
+
+    # fork shares solution buffer with workers, other start methods get copies of chunks
+    use_fork = 'fork' in multiprocessing.get_all_start_methods()
+    context = multiprocessing.get_context('fork' if use_fork else None)
+
+    _shared['data'] = solution_data
+    _shared['room_name_array'] = map.room_name_array
+    _shared['number_of_ants'] = map.number_of_ants
+
+    if use_fork:
+        tasks = chunks
+    else:
+        tasks = [bytes(solution_data[begin:end]) for begin, end in chunks]
+
+    try:
+        with ProcessPoolExecutor(max_workers=jobs, mp_context=context,
+                                 initializer=init_worker,
+                                 initargs=(map.room_name_array, map.number_of_ants)) as pool:
+            results = list(pool.map(parse_chunk, tasks))
+    finally:
+        _shared.clear()
+
+    # line parser handles unusual input and errors
+    if any(result is None for result, _ in results):
+        return parse_solution_lines(iter_lines(solution_data), map)
+
+    merge_begin = time.perf_counter()
+    solution = merge_chunks(map, [result for result, _ in results])
+    parse_end = time.perf_counter()
+
+    if report:
+        # serial parse is not run, its time is estimated as cpu time of chunks plus merge,
+        # parallel time is measured and includes starting workers and sending results back
+        estimated_serial_time = sum(chunk_time for _, chunk_time in results) + parse_end - merge_begin
+        parallel_time = parse_end - parse_begin
+        print(f"parallel solution parse: {len(chunks)} chunks, {jobs} jobs, {parallel_time:.3f} s, "
+              f"estimated speedup x{estimated_serial_time / parallel_time:.2f} "
+              f"(chunk cpu time and merge {estimated_serial_time:.3f} s)", file=report)
+
+    return solution
+
+
+def split_chunks(solution_data, number_of_chunks):
+    "split buffer into about equal [begin end) ranges ending right after line break"
+    data = np.frombuffer(solution_data, dtype=np.uint8)
+    line_ends = np.flatnonzero(data == ord('\n')) + 1
+
+    # approximate chunk bounds moved forward to nearest line end
+    approximate_ends = np.arange(1, number_of_chunks) * len(data) // number_of_chunks
+    chunk_ends = line_ends[np.minimum(np.searchsorted(line_ends, approximate_ends), len(line_ends) - 1)] \
+        if len(line_ends) else np.zeros(0, dtype=np.int64)
+
+    bounds = np.unique(np.concatenate(([0], chunk_ends, [len(data)])))
+
+    return [(begin, end) for begin, end in zip(bounds[:-1].tolist(), bounds[1:].tolist())]
+
+
+def merge_chunks(map, chunk_results):
+    "concatenate chunk move tables shifting steps by number of lines in previous chunks"
+    step_offset = 0
+    chunk_moves = []
+
+    for moves, number_of_lines in chunk_results:
+        moves[:, 0] += step_offset
+        chunk_moves.append(moves)
+        step_offset += number_of_lines
+
+    return build_solution(map, np.concatenate(chunk_moves), step_offset + 1)
+
+
+def init_worker(room_name_array, number_of_ants):
+    "with start methods other than fork worker gets room name table once"
+    if 'room_name_array' not in _shared:
+        _shared['room_name_array'] = room_name_array
+        _shared['number_of_ants'] = number_of_ants
+
+
+def parse_chunk(task):
+    "worker: bulk parse one chunk, return its move table and parse cpu time"
+    begin_time = time.process_time()
+
+    if isinstance(task, tuple):
+        begin, end = task
+        chunk = _shared['data'][begin:end]
+    else:
+        chunk = task
+
+    result = split_solution_moves(chunk, _shared['room_name_array'], _shared['number_of_ants'])
+
+    return (result, time.process_time() - begin_time)
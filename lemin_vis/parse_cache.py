@@ -0,0 +1,212 @@
+import os
+import sys
+import json
+import shutil
+import hashlib
+import tempfile
+
+import numpy as np
+
+from lemin_vis.map_parser import Map
+from lemin_vis.solution_parser import CompactTimeline, Rect, create_solution
+
+# bump when stored arrays change
+CACHE_FORMAT_VERSION = 2
+
+HASH_CHUNK_SIZE = 16 * 1024 * 1024
+
+# every cache entry is a directory of .npy arrays named by input content hash
+ARRAY_NAMES = ['room_names', 'room_coords', 'link_array', 'moves', 'solution_rooms',
+               'path_rooms', 'path_lengths', 'ant_path_ids', 'ant_departures']
+
+# stored only for solutions where ants wait on their way
+TIMELINE_ARRAY_NAME = 'timeline'
+
+
+def default_cache_dir():
+    cache_home = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(cache_home, 'lemin_visual')
+
+
+class ParseCache:
+    """
+        parsed map and solution of input files stored on disk as raw numpy arrays,
+        entries are keyed by content hash of input file,
+        index of file path, size and modification time to hash
+        saves hashing of unchanged files, changed file gets new hash and its old entry is removed
+        arrays are memory mapped on load so nothing is parsed or copied
+    """
+
+    def __init__(self, cache_dir=None):
+        self.cache_dir = cache_dir or default_cache_dir()
+        self.index_path = os.path.join(self.cache_dir, 'index.json')
+
+    def load(self, filename):
+        "return (map, solution) from cache or None if file was not cached or has changed"
+        try:
+            entry_dir = self.entry_dir(self.content_hash(filename))
+            with open(os.path.join(entry_dir, 'meta.json')) as meta_file:
+                meta = json.load(meta_file)
+            if meta['version'] != CACHE_FORMAT_VERSION:
+                return None
+
+            array_names = ARRAY_NAMES if meta['compact'] else ARRAY_NAMES + [TIMELINE_ARRAY_NAME]
+            arrays = {name: np.load(os.path.join(entry_dir, name + '.npy'), mmap_mode='r')
+                      for name in array_names}
+        except (OSError, ValueError, KeyError):
+            return None
+
+        return restore_map_and_solution(meta, arrays)
+
+    def store(self, filename, map, solution):
+        """
+            save successfully parsed map and solution, errors are not cached,
+            cache which can not be written is skipped with a warning, input is already parsed
+        """
+        if map.error or solution.error or not solution.complete:
+            return
+
+        temp_dir = None
+        try:
+            entry_dir = self.entry_dir(self.content_hash(filename))
+            if os.path.exists(entry_dir):
+                return
+
+            os.makedirs(self.cache_dir, exist_ok=True)
+
+            # entry appears at once when complete, interrupted writes leave no entry
+            temp_dir = tempfile.mkdtemp(dir=self.cache_dir)
+            meta, arrays = dump_map_and_solution(map, solution)
+            for name, array in arrays.items():
+                np.save(os.path.join(temp_dir, name + '.npy'), array)
+
+            with open(os.path.join(temp_dir, 'meta.json'), 'w') as meta_file:
+                json.dump(meta, meta_file)
+
+            os.rename(temp_dir, entry_dir)
+        except OSError as ex:
+            if temp_dir is not None:
+                shutil.rmtree(temp_dir, ignore_errors=True)
+            print(f"CacheWarning: parsed input is not cached: {ex}", file=sys.stderr)
+
+    def entry_dir(self, content_hash):
+        return os.path.join(self.cache_dir, content_hash)
+
+    def content_hash(self, filename):
+        "hash of file contents, taken from index while file size and modification time are unchanged"
+        path = os.path.abspath(filename)
+        stat = os.stat(path)
+        file_key = [stat.st_size, stat.st_mtime_ns]
+
+        index = self.read_index()
+        indexed = index.get(path)
+        if indexed and indexed['stat'] == file_key:
+            return indexed['hash']
+
+        content_hash = hash_file(path)
+
+        # file has changed: entry of its old contents is not needed any more
+        if indexed and indexed['hash'] != content_hash:
+            shutil.rmtree(self.entry_dir(indexed['hash']), ignore_errors=True)
+
+        index[path] = {'stat': file_key, 'hash': content_hash}
+        self.write_index(index)
+
+        return content_hash
+
+    def read_index(self):
+        try:
+            with open(self.index_path) as index_file:
+                return json.load(index_file)
+        except (OSError, ValueError):
+            return {}
+
+    def write_index(self, index):
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            with open(self.index_path, 'w') as index_file:
+                json.dump(index, index_file)
+        except OSError:
+            pass
+
+
+def hash_file(path):
+    content_hash = hashlib.blake2b(digest_size=16)
+
+    with open(path, 'rb') as input_file:
+        while True:
+            chunk = input_file.read(HASH_CHUNK_SIZE)
+            if not chunk:
+                break
+            content_hash.update(chunk)
+
+    return content_hash.hexdigest()
+
+
+def dump_map_and_solution(map, solution):
+    "meta data and arrays enough to restore map and solution without parsing"
+    rect = solution.rect
+    meta = {
+        'version': CACHE_FORMAT_VERSION,
+        'number_of_ants': int(map.number_of_ants),
+        'start_index': None if map.start_index is None else int(map.start_index),
+        'end_index': None if map.end_index is None else int(map.end_index),
+        'number_of_steps': int(solution.number_of_steps),
+        'rect': [int(rect.top), int(rect.left), int(rect.bottom), int(rect.right)] if rect else None,
+        'compact': isinstance(solution.timeline, CompactTimeline),
+    }
+
+    arrays = {
+        'room_names': map.room_name_array,
+        'room_coords': map.room_coords,
+        'link_array': map.link_array,
+        'moves': solution.moves,
+        'solution_rooms': np.array(sorted(solution.all_rooms), dtype=np.int32),
+
+        # unique paths one after another
+        'path_rooms': np.array([room_id for path in solution.paths for room_id in path], dtype=np.int32),
+        'path_lengths': np.array([len(path) for path in solution.paths], dtype=np.int64),
+        'ant_path_ids': solution.ant_path_ids,
+        'ant_departures': solution.ant_departures,
+    }
+
+    if not meta['compact']:
+        arrays[TIMELINE_ARRAY_NAME] = solution.timeline[:solution.number_of_steps]
+
+    return (meta, arrays)
+
+
+def restore_map_and_solution(meta, arrays):
+    map = Map()
+    map.number_of_ants = meta['number_of_ants']
+    map.start_index = meta['start_index']
+    map.end_index = meta['end_index']
+    map.room_coords = arrays['room_coords']
+    map.link_array = arrays['link_array']
+
+    room_name_array = arrays['room_names']
+    map.room_names = [name.decode() for name in room_name_array.tolist()]
+    map.room_ids = {name: room_id for room_id, name in enumerate(map.room_names)}
+    map._room_name_array = room_name_array
+
+    solution = create_solution(map)
+    solution.number_of_steps = meta['number_of_steps']
+    solution.moves = arrays['moves']
+    solution.all_rooms = set(arrays['solution_rooms'].tolist())
+    solution.rect = Rect(*meta['rect']) if meta['rect'] else None
+
+    path_rooms = arrays['path_rooms'].tolist()
+    path_ends = np.cumsum(arrays['path_lengths']).tolist()
+    solution._paths = [path_rooms[begin:end] for begin, end in zip([0] + path_ends[:-1], path_ends)]
+    solution._ant_path_ids = arrays['ant_path_ids']
+    solution.ant_departures = arrays['ant_departures']
+    solution.path_trie = None
+
+    if meta['compact']:
+        solution.timeline = CompactTimeline(solution.paths, solution.ant_path_ids,
+                                            solution.ant_departures, solution.number_of_steps)
+    else:
+        solution.timeline = arrays[TIMELINE_ARRAY_NAME]
+    solution.complete = True
+
+    return (map, solution)
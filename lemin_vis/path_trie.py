@@ -0,0 +1,89 @@
+import numpy as np
+
+
+class PathTrie:
+    """
+        room sequences ants pass through interned as trie nodes,
+        node is identified by its parent node and its room, root is start room,
+        every ant refers to the node of rooms it has passed so far
+        so ants with the same path share one node
+    """
+
+    def __init__(self, start_room, number_of_ants):
+        self.node_parents = [-1]
+        self.node_rooms = [start_room]
+        self.children = {}  # (parent node, room) -> node
+        self.ant_nodes = [0] * number_of_ants
+        self._paths = None
+
+    def move_ant(self, ant_index, room_id):
+        key = (self.ant_nodes[ant_index], room_id)
+
+        node = self.children.get(key)
+        if node is None:
+            node = self.children[key] = len(self.node_rooms)
+            self.node_parents.append(key[0])
+            self.node_rooms.append(room_id)
+
+        self.ant_nodes[ant_index] = node
+        self._paths = None
+
+    def rooms(self, node):
+        "room sequence from start room to node"
+        rooms = []
+        while node != -1:
+            rooms.append(self.node_rooms[node])
+            node = self.node_parents[node]
+
+        return rooms[::-1]
+
+    def paths(self):
+        "unique paths and path id of every ant, paths are numbered in order of their first ants"
+        if self._paths is None:
+            nodes, _, ant_path_ids = number_by_first_ant(np.array(self.ant_nodes, dtype=np.int64))
+            self._paths = ([self.rooms(node) for node in nodes.tolist()], ant_path_ids)
+
+        return self._paths
+
+
+def number_by_first_ant(ant_keys):
+    """
+        distinct keys in order of first ant having them, first ants of keys
+        and index of every ant key in that order, keys are values or rows
+    """
+    axis = 0 if ant_keys.ndim > 1 else None
+    unique_keys, first_ants, key_index = np.unique(ant_keys, axis=axis, return_index=True, return_inverse=True)
+
+    order = np.argsort(first_ants, kind='stable')
+    renumber = np.empty_like(order)
+    renumber[order] = np.arange(len(order))
+
+    return (unique_keys[order], first_ants[order], renumber[key_index.ravel()].astype(np.int32))
+
+
+def intern_paths(start_room, ant_rooms, moves_per_ant):
+    """
+        vectorized trie build: ants rooms (ordered by ant, start room excluded) are interned
+        one trie level at a time, nodes of a level are numbered by unique (parent node, room) pairs,
+        return unique paths and path id of every ant like PathTrie.paths
+    """
+    number_of_ants = len(moves_per_ant)
+    ant_offsets = np.cumsum(moves_per_ant) - moves_per_ant
+
+    nodes = np.zeros(number_of_ants, dtype=np.int64)
+    next_node = 1
+    for depth in range(int(moves_per_ant.max(initial=0))):
+        ants = np.flatnonzero(moves_per_ant > depth)
+        keys = nodes[ants] << 32 | ant_rooms[ant_offsets[ants] + depth].astype(np.int64)
+
+        unique_keys, level_nodes = np.unique(keys, return_inverse=True)
+        nodes[ants] = next_node + level_nodes.ravel()
+        next_node += len(unique_keys)
+
+    # path rooms are taken from the first ant of every path
+    _, first_ants, ant_path_ids = number_by_first_ant(nodes)
+
+    bounds = zip(ant_offsets[first_ants].tolist(), (ant_offsets + moves_per_ant)[first_ants].tolist())
+    paths = [[start_room] + ant_rooms[begin:end].tolist() for begin, end in bounds]
+
+    return (paths, ant_path_ids)
@@ -0,0 +1,43 @@
+import numpy as np
+import shiboken2
+
+from PySide2.QtGui import QPolygonF
+
+
+class PointBuffer:
+    """
+        QPolygonF which point memory is shared with numpy array,
+        points are written by numpy in place and drawn by one QPainter.drawPoints call
+    """
+
+    def __init__(self, capacity):
+        self.polygon = QPolygonF()
+        self.polygon.resize(capacity)
+        self.address = None
+        self.points = np.zeros((0, 2))
+        self.map_points()
+
+    def map_points(self):
+        "(re)create numpy view of polygon points if polygon memory has moved"
+        size = self.polygon.size()
+        if size == 0:
+            return
+
+        address = shiboken2.getCppPointer(self.polygon.data())[0]
+        if address != self.address or len(self.points) < size:
+            # QPointF is two doubles
+            memory = shiboken2.VoidPtr(address, size * 2 * 8, True)
+            self.points = np.frombuffer(memory, dtype=np.float64).reshape(size, 2)
+            self.address = address
+
+    def take(self, positions, indices):
+        "set polygon points to positions[indices] without allocating new points"
+        # shrinking QPolygonF keeps its capacity so memory normally stays in place
+        self.polygon.resize(len(indices))
+        self.map_points()
+
+        np.take(positions, indices, axis=0, out=self.points[:len(indices)])
+
+    def draw(self, painter):
+        if self.polygon.size():
+            painter.drawPoints(self.polygon)
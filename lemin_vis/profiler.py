@@ -0,0 +1,150 @@
+import json
+import time
+import functools
+from collections import deque
+from contextlib import contextmanager
+
+# last frames kept for frame time percentiles and stage breakdown
+PROFILE_FRAMES = 1000
+
+# frames per second are counted over this many last seconds
+FPS_WINDOW = 1.0
+
+
+class Profiler:
+    """
+        wall time of named stages: stages of every view frame (animation, set_step, draw layers)
+        and one time phases like reading and parsing input,
+        stages may be nested, the same stage repeated in one frame adds up
+    """
+    def __init__(self, number_of_frames=PROFILE_FRAMES):
+        self.phases = {}  # phase name -> seconds
+        self.frames = deque(maxlen=number_of_frames)  # (seconds since previous frame, work seconds, stage seconds)
+        self.stage_depths = {}  # nesting depth of stage when first seen, keeps stages in order
+        self.current = {}  # stage seconds of frame being drawn
+        self.depth = 0
+        self.last_frame_end = None
+        self.total_frames = 0
+
+    @contextmanager
+    def stage(self, name):
+        "time stage of current frame"
+        self.stage_depths.setdefault(name, self.depth)
+        self.depth += 1
+        begin = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.depth -= 1
+            self.current[name] = self.current.get(name, 0.0) + time.perf_counter() - begin
+
+    @contextmanager
+    def phase(self, name):
+        "time one time phase like parsing"
+        begin = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = self.phases.get(name, 0.0) + time.perf_counter() - begin
+
+    def end_frame(self):
+        "store stages timed since previous frame, frame work is the time of outermost stages"
+        now = time.perf_counter()
+        interval = None if self.last_frame_end is None else now - self.last_frame_end
+        work = sum(seconds for name, seconds in self.current.items() if self.stage_depths[name] == 0)
+
+        self.frames.append((interval, work, self.current))
+        self.current = {}
+        self.last_frame_end = now
+        self.total_frames += 1
+
+    def fps(self):
+        "frames per second over last FPS_WINDOW seconds of drawing"
+        elapsed = 0.0
+        number_of_frames = 0
+
+        for interval, _, _ in reversed(self.frames):
+            if interval is None:
+                break
+            elapsed += interval
+            number_of_frames += 1
+            if elapsed >= FPS_WINDOW:
+                break
+
+        return number_of_frames / elapsed if elapsed > 0 else 0.0
+
+    def stats(self):
+        "phases in seconds, fps, frame work percentiles and mean / p95 / max of every stage in ms"
+        frames = list(self.frames)
+        stages = {}
+
+        for name, depth in self.stage_depths.items():
+            stage_stats = percentiles([stage_times.get(name, 0.0) * 1000 for _, _, stage_times in frames])
+            stages[name] = {
+                'depth': depth,
+                'mean_ms': stage_stats['mean'],
+                'p95_ms': stage_stats['p95'],
+                'max_ms': stage_stats['max'],
+            }
+
+        return {
+            'phases_s': dict(self.phases),
+            'frames': self.total_frames,
+            'fps': self.fps(),
+            'frame_ms': percentiles([work * 1000 for _, work, _ in frames]),
+            'stages': stages,
+        }
+
+    def hud_text(self):
+        "stats of last frames as monospace text for on screen display"
+        stats = self.stats()
+        frame_ms = stats['frame_ms']
+
+        lines = [
+            f"fps {stats['fps']:6.1f}   frames {stats['frames']}",
+            f"frame ms  p50 {frame_ms['p50']:.2f}  p95 {frame_ms['p95']:.2f}"
+            f"  p99 {frame_ms['p99']:.2f}  max {frame_ms['max']:.2f}",
+            f"{'stage':<22}{'mean':>8}{'p95':>8}{'max':>8}",
+        ]
+        for name, stage in stats['stages'].items():
+            lines.append(f"{'  ' * stage['depth'] + name:<22}"
+                         f"{stage['mean_ms']:8.2f}{stage['p95_ms']:8.2f}{stage['max_ms']:8.2f}")
+
+        return '\n'.join(lines)
+
+    def dump(self, path):
+        "write stats to json file"
+        with open(path, 'w') as stats_file:
+            json.dump(self.stats(), stats_file, indent=1)
+
+
+def percentiles(values):
+    """
+        mean, p50, p95, p99 and max of values, zeros if there are none,
+        plain python: profiler is imported before numpy is needed
+    """
+    if not values:
+        return {'mean': 0.0, 'p50': 0.0, 'p95': 0.0, 'p99': 0.0, 'max': 0.0}
+
+    values = sorted(values)
+
+    def percentile(part):
+        # linear between closest ranks like numpy.percentile
+        position = part * (len(values) - 1)
+        lower = int(position)
+        upper = min(lower + 1, len(values) - 1)
+        return values[lower] + (values[upper] - values[lower]) * (position - lower)
+
+    return {'mean': sum(values) / len(values), 'p50': percentile(0.5), 'p95': percentile(0.95),
+            'p99': percentile(0.99), 'max': values[-1]}
+
+
+def profiled(name):
+    "time method as a stage of profiler of its object"
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            with self.profiler.stage(name):
+                return method(self, *args, **kwargs)
+        return wrapper
+    return decorator
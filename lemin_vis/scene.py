@@ -0,0 +1,582 @@
+import html
+from dataclasses import dataclass
+import math
+
+import numpy as np
+
+from PySide2.QtGui import QPainter, QPen, QBrush, QColor, QPainterPath, QTransform, QStaticText, QTextOption, QFont, QFontMetrics, QPixmap
+from PySide2.QtCore import QRect, QRectF, Qt, QPoint, QPointF, QLineF
+
+from lemin_vis.spatial_index import SpatialGrid
+from lemin_vis.level_of_detail import LevelOfDetail, simplify_polyline
+from lemin_vis.point_buffer import PointBuffer
+from lemin_vis.tile_cache import TileCache, DEFAULT_TILE_CACHE_MB
+from lemin_vis.profiler import Profiler, profiled
+
+BACKGROUND_COLOR = "#1D212D"
+
+MIN_ZOOM = 0.01
+MAX_ZOOM = 200
+
+# screen space grid of room labels, label takes every cell its text covers,
+# labels covering a taken cell are skipped
+LABEL_CELL_WIDTH = 80
+LABEL_CELL_HEIGHT = 28
+LABEL_WIDTH = 200
+
+# rooms this many pixels out of view take part in choosing labels drawn in view
+LABEL_MARGIN = LABEL_WIDTH / 2 + LABEL_CELL_WIDTH
+
+
+@dataclass
+class Camera:
+    viewport: object  # paint device: widget, image or svg generator
+    pos: QPointF
+    zoom: float
+
+    def fit_solution_in_view(self, solution):
+        if not solution.rect:
+            return
+
+        solution_rect = QRect(QPoint(solution.rect.left, solution.rect.top),
+                              QPoint(solution.rect.right, solution.rect.bottom))
+
+        viewport_rect = device_rect(self.viewport)
+
+        # compute zoom level
+        if solution_rect.width() > solution_rect.height():
+            zoom = viewport_rect.width() / solution_rect.width() if viewport_rect.width() else 1
+        else:
+            zoom = viewport_rect.height() / solution_rect.height() if viewport_rect.height() else 1
+
+        self.zoom = 0.80 * zoom if zoom else 1
+        self.zoom = clamp(self.zoom, MIN_ZOOM, MAX_ZOOM)  # limit zoom level
+
+        # center view on rect center
+        self.pos = -QPointF(solution_rect.center())
+
+
+def device_rect(device):
+    "rect of paint device, svg generator has no rect() of its own"
+    return QRect(0, 0, device.width(), device.height())
+
+
+def clamp(v, smallest, largest):
+    "limit value on both sides"
+    return max(smallest, min(v, largest))
+
+
+class Scene:
+    """
+        map, solution paths, ants and labels drawn by QPainter to any paint device:
+        view widget on screen or offscreen image,
+        viewport is the paint device scene is sized by
+    """
+    room_size = 28
+    ant_size = 16
+
+    def __init__(self, map, solution, viewport, tile_cache_mb=DEFAULT_TILE_CACHE_MB, profiler=None):
+        self.map = map
+        self.solution = solution
+        self.viewport = viewport
+        self.camera = Camera(viewport, QPointF(0, 0), 1)
+        self.collapse_ants = False  # draw count badges instead of ants in start and end rooms, toggled by C
+        self.profiler = profiler if profiler is not None else Profiler()  # times every draw layer
+
+        self.create_pens()
+        self.create_labels()
+        self.create_link_layer()
+        self.create_spatial_index()
+
+        # static map layers are drawn from cached tiles
+        self.tile_cache = TileCache(self.render_tile, tile_cache_mb)
+
+        self.create_solution_paths()
+
+        self.camera.fit_solution_in_view(solution)
+
+    def create_link_layer(self):
+        """
+            optimization: store all links in QPainterPath object
+            to draw it in one call
+        """
+        self.link_layer = lines_path(self.map.room_coords, self.map.link_array)
+
+    def create_spatial_index(self):
+        "index rooms and links by position to draw only those inside of view"
+        self.spatial_index = SpatialGrid(self.map.room_coords, self.map.link_array)
+        self.visible_rooms = np.arange(self.map.number_of_rooms)
+        self.visible_links = np.arange(self.map.number_of_links)
+        self.all_links_visible = True
+
+        # simplified geometry for zoomed out views
+        self.level_of_detail = LevelOfDetail(self.map.room_coords, self.map.link_array, self.room_size)
+        self.detail_band = 0
+        self.band_link_layers = {}
+        self.visible_room_cells = np.zeros(0, dtype=np.intp)
+        self.room_cell_buffer = PointBuffer(0)
+
+    def create_solution_paths(self):
+        self.solution_paths = []
+
+        # ants with the same path share it
+        self.room_paths = self.solution.paths
+        ant_path_ids = self.solution.ant_path_ids
+
+        # add ant paths to view
+        coords = self.map.room_coords.tolist()
+        for path in self.room_paths:
+            qpath = QPainterPath()
+            for from_id, to_id in zip(path, path[1:]):
+                from_x, from_y = coords[from_id]
+                to_x, to_y = coords[to_id]
+
+                qpath.moveTo(from_x, from_y)
+                qpath.lineTo(to_x, to_y)
+
+            self.solution_paths.append(qpath)
+
+        # simplified paths for zoomed out views are made on first use
+        self.band_solution_paths = {0: self.solution_paths}
+
+        # cached tiles have old paths drawn on them
+        self.tile_cache.clear()
+
+        # ants of paths sharing the same pen are drawn together
+        pen_num = len(self.solution_path_pens)
+        self.pen_ants = [np.flatnonzero(ant_path_ids % pen_num == i) for i in range(pen_num)]
+        self.ant_buffers = [PointBuffer(len(ants)) for ants in self.pen_ants]
+
+        # names are drawn for solution rooms only
+        self.solution_room_mask = np.zeros(self.map.number_of_rooms, dtype=bool)
+        self.solution_room_mask[list(self.solution.all_rooms)] = True
+
+    def create_pens(self):
+        pen = QPen(QColor("#33434B"), 3)
+        pen.setCosmetic(True)  # makes pen size zoom independent
+        self.link_pen = pen
+
+        pen = QPen(QColor("#5A667A"), self.room_size)
+        pen.setCosmetic(True)  # makes pen size zoom independent
+        self.room_pen = pen
+
+        pen = QPen(QColor("#FF0266"), self.ant_size)
+        pen.setCosmetic(True)  # makes pen size zoom independent
+        self.ant_pen = pen
+
+        pen = QPen(QColor("#AAAAAA"), 1)
+        self.text_pen = pen
+
+        pen = QPen(QColor("#20FF20"), 1)
+        self.special_text_pen = pen
+
+        self.badge_pen = QPen(QColor("#FFFFFF"), 1)
+        self.badge_brush = QBrush(QColor("#FF0266"))
+
+        # create path pens
+        ant_colors = ["#FF008D", "#FF00FF", "#FFE100", "#FF0000"]
+
+        self.solution_path_pens = [QPen(QColor(color).darker(100), 3)
+                                   for color in ant_colors]
+
+        for pen in self.solution_path_pens:
+            pen.setCosmetic(True)
+
+        self.ant_pens = [QPen(QColor(color), self.ant_size)
+                         for color in ant_colors]
+
+        for pen in self.ant_pens:
+            pen.setCosmetic(True)
+
+    def paint(self, painter):
+        "draw whole scene for current solution step and camera"
+        painter.setFont(self.label_font)
+
+        # clear background
+        painter.setBackground(QColor(BACKGROUND_COLOR))
+        painter.eraseRect(device_rect(self.viewport))
+
+        # switch level of detail by zoom
+        self.detail_band = self.level_of_detail.band(self.camera.zoom)
+
+        if self.tile_cache.enabled:
+            self.draw_map_tiles(painter)
+            self.find_visible_items(self.view_rect())
+            self.apply_camera(painter)
+        else:
+            self.apply_camera(painter)
+            self.find_visible_items(self.view_rect())
+            self.draw_map_layers(painter)
+
+        self.draw_ants(painter)
+
+        # reset transform
+        painter.resetMatrix()
+
+        self.draw_room_names(painter)
+
+        self.draw_ant_badges(painter)
+
+    def draw_map_layers(self, painter):
+        "static part of the map, does not change while ants move"
+        self.draw_links(painter)
+
+        self.draw_rooms(painter)
+
+        self.draw_solution_paths(painter)
+
+    @profiled('map_tiles')
+    def draw_map_tiles(self, painter):
+        "blit cached tiles covering the view, missing tiles are rendered"
+        zoom = self.camera.zoom
+        tile_size = self.tile_cache.tile_size
+
+        # screen position of map origin, tiles are aligned to it
+        origin = self.mvp().map(QPointF(0, 0))
+        first_column = math.floor(-origin.x() / tile_size)
+        last_column = math.floor((self.viewport.width() - origin.x()) / tile_size)
+        first_row = math.floor(-origin.y() / tile_size)
+        last_row = math.floor((self.viewport.height() - origin.y()) / tile_size)
+
+        for row in range(first_row, last_row + 1):
+            for column in range(first_column, last_column + 1):
+                pixmap = self.tile_cache.tile(zoom, column, row)
+                painter.drawPixmap(origin + QPointF(column * tile_size, row * tile_size), pixmap)
+
+    def render_tile(self, zoom, column, row, tile_size):
+        "draw static map layers to tile pixmap"
+        pixmap = QPixmap(tile_size, tile_size)
+        pixmap.fill(QColor(BACKGROUND_COLOR))
+
+        # tile is a square of screen pixels at given zoom, counted from map origin
+        transform = QTransform()
+        transform.translate(-column * tile_size, -row * tile_size)
+        transform.scale(zoom, zoom)
+
+        # rooms near tile sides are partially drawn on tiles next to it
+        margin = self.room_size / zoom
+        tile_rect = QRectF(column * tile_size / zoom, row * tile_size / zoom, tile_size / zoom, tile_size / zoom)
+        tile_rect.adjust(-margin, -margin, margin, margin)
+        self.find_visible_items(tile_rect)
+
+        painter = QPainter(pixmap)
+        painter.setTransform(transform)
+        self.draw_map_layers(painter)
+        painter.end()
+
+        return pixmap
+
+    def apply_camera(self, painter):
+        mvp = self.mvp()
+        painter.setTransform(mvp)
+
+    def mvp(self):
+        view_center = device_rect(self.viewport).center()
+        zoom = self.camera.zoom
+
+        # map origin is kept on whole pixel so cached tiles match directly drawn items
+        origin_x = round(view_center.x() + zoom * self.camera.pos.x())
+        origin_y = round(view_center.y() + zoom * self.camera.pos.y())
+
+        mvp = QTransform()
+        mvp.translate(origin_x, origin_y)
+        mvp.scale(zoom, zoom)
+        return mvp
+
+    def zoom_reverse(self, x):
+        return x/self.camera.zoom
+
+    def view_rect(self):
+        "view rect in map coordinates, extended to include room names drawn around rooms"
+        margin = self.zoom_reverse(LABEL_MARGIN)
+        view_rect = self.mvp().inverted()[0].mapRect(QRectF(device_rect(self.viewport)))
+        view_rect.adjust(-margin, -margin, margin, margin)
+
+        return view_rect
+
+    @profiled('visible_items')
+    def find_visible_items(self, visible_rect):
+        "query spatial index for rooms and links inside of rect in map coordinates"
+        self.visible_rect = visible_rect
+        rect = (visible_rect.left(), visible_rect.top(), visible_rect.right(), visible_rect.bottom())
+
+        self.visible_rooms = self.spatial_index.rooms_in_rect(*rect)
+
+        if self.detail_band:
+            band = self.level_of_detail.detail_band(self.detail_band)
+            self.visible_room_cells = band.room_cells_in_rect(*rect)
+            self.all_links_visible = band.spatial_index.contains_all(*rect) if band.link_array.size else True
+            if not self.all_links_visible:
+                self.visible_links = band.spatial_index.links_in_rect(*rect)
+            return
+
+        self.all_links_visible = self.spatial_index.contains_all(*rect)
+        if not self.all_links_visible:
+            self.visible_links = self.spatial_index.links_in_rect(*rect)
+
+    @profiled('links')
+    def draw_links(self, painter):
+        painter.setPen(self.link_pen)
+
+        if self.detail_band:
+            band = self.level_of_detail.detail_band(self.detail_band)
+            coords, link_array = band.points, band.link_array
+        else:
+            coords, link_array = self.map.room_coords, self.map.link_array
+
+        # whole map is in view: draw prebuilt path in one call
+        if self.all_links_visible:
+            painter.drawPath(self.band_link_layer(self.detail_band))
+            return
+
+        link_coords = np.hstack((coords[link_array[self.visible_links, 0]],
+                                 coords[link_array[self.visible_links, 1]]))
+        painter.drawLines([QLineF(*line) for line in link_coords.tolist()])
+
+    def band_link_layer(self, detail_band):
+        if detail_band == 0:
+            return self.link_layer
+
+        link_layer = self.band_link_layers.get(detail_band)
+        if link_layer is None:
+            band = self.level_of_detail.detail_band(detail_band)
+            link_layer = self.band_link_layers[detail_band] = lines_path(band.points, band.link_array)
+
+        return link_layer
+
+    @profiled('solution_paths')
+    def draw_solution_paths(self, painter):
+        pen_num = len(self.solution_path_pens)
+        for i, path in enumerate(self.band_paths(self.detail_band)):
+            if path.controlPointRect().intersects(self.visible_rect):
+                painter.setPen(self.solution_path_pens[i % pen_num])
+                painter.drawPath(path)
+
+    def band_paths(self, detail_band):
+        "solution paths with rooms closer than a pixel merged"
+        paths = self.band_solution_paths.get(detail_band)
+        if paths is None:
+            pixel = self.level_of_detail.pixel_size(detail_band)
+            paths = self.band_solution_paths[detail_band] = [
+                polyline_path(simplify_polyline(self.map.room_coords[list(path)], pixel))
+                for path in self.room_paths]
+
+        return paths
+
+    @profiled('rooms')
+    def draw_rooms(self, painter):
+        painter.setPen(self.room_pen)
+
+        # zoomed out: one dot per room density cell
+        if self.detail_band:
+            band = self.level_of_detail.detail_band(self.detail_band)
+            self.room_cell_buffer.take(band.room_cells, self.visible_room_cells)
+            self.room_cell_buffer.draw(painter)
+            return
+
+        for x, y in self.map.room_coords[self.visible_rooms].tolist():
+            painter.drawPoint(x, y)
+
+    @profiled('ants')
+    def draw_ants(self, painter):
+        if self.solution.error:
+            return
+
+        positions = self.solution.positions
+
+        if self.collapse_ants:
+            # ants in start and end rooms are shown by count badges instead
+            collapsed = self.ants_in_room(self.map.start_index) | self.ants_in_room(self.map.end_index)
+
+        for pen, ants, buffer in zip(self.ant_pens, self.pen_ants, self.ant_buffers):
+            if self.collapse_ants:
+                ants = ants[~collapsed[ants]]
+
+            # one draw call per pen
+            buffer.take(positions, ants)
+            painter.setPen(pen)
+            buffer.draw(painter)
+
+    def ants_in_room(self, room_id):
+        "mask of ants standing exactly in room, no ants for missing start or end room"
+        if room_id is None:
+            return np.zeros(self.solution.number_of_ants, dtype=bool)
+
+        room_x, room_y = self.map.room_coords[room_id].tolist()
+        positions = self.solution.positions
+
+        return (positions[:, 0] == room_x) & (positions[:, 1] == room_y)
+
+    @profiled('ant_badges')
+    def draw_ant_badges(self, painter):
+        "number of ants waiting in start room and arrived to end room"
+        if not self.collapse_ants or self.solution.error or self.map.error:
+            return
+
+        mvp = self.mvp()
+        painter.setPen(self.badge_pen)
+        painter.setBrush(self.badge_brush)
+
+        for room_id in (self.map.start_index, self.map.end_index):
+            count = int(np.count_nonzero(self.ants_in_room(room_id)))
+            if count == 0:
+                continue
+
+            room_c = mvp.map(QPointF(*self.map.room_coords[room_id].tolist()))
+            text = str(count)
+            width = painter.fontMetrics().horizontalAdvance(text) + self.room_size / 2
+            badge = QRectF(0, 0, max(width, self.room_size), self.room_size)
+            badge.moveCenter(room_c + QPointF(self.room_size, -self.room_size))
+
+            painter.drawRoundedRect(badge, self.room_size / 2, self.room_size / 2)
+            painter.drawText(badge, Qt.AlignCenter, text)
+
+        painter.setBrush(Qt.NoBrush)
+
+    @profiled('room_names')
+    def draw_room_names(self, painter):
+        """
+            draw cached labels of visible solution rooms and of start and end rooms,
+            when zoomed out labels overlapping already placed ones are skipped:
+            every placed label takes all screen cells its text covers
+        """
+        if self.map.error:
+            return
+
+        # manually transform text position to draw text unaffected by zoom
+        mvp = self.mvp()
+        label_offset = self.label_offset
+
+        # map parser accepts maps without start or end room
+        special_rooms = np.array([room_id for room_id, _, _ in self.special_labels], dtype=np.int64)
+        number_of_special = len(special_rooms)
+
+        visible_solution_rooms = self.visible_rooms[self.solution_room_mask[self.visible_rooms]]
+        rooms = np.concatenate((special_rooms, visible_solution_rooms))
+        if not len(rooms):
+            return
+
+        # room screen positions, camera transform is scale and translation only
+        screen_xy = self.map.room_coords[rooms] * [mvp.m11(), mvp.m22()] + [mvp.dx(), mvp.dy()]
+
+        # candidates: first room in every cell, cells are counted from map origin
+        # so the same labels are chosen wherever view is
+        x, y = screen_xy.T
+        columns = np.floor_divide(x - mvp.dx(), LABEL_CELL_WIDTH)
+        columns -= columns.min()
+        cells = np.floor_divide(y - mvp.dy(), LABEL_CELL_HEIGHT) * (columns.max() + 1) + columns
+        _, first_in_cell = np.unique(cells, return_index=True)
+        candidates = first_in_cell[first_in_cell >= number_of_special]
+
+        # skip labels out of screen, labels are drawn under rooms
+        width, height = self.viewport.width(), self.viewport.height()
+        x, y = screen_xy[candidates].T
+        candidates = candidates[(x > -LABEL_WIDTH) & (x < width + LABEL_WIDTH) &
+                                (y > -2 * LABEL_CELL_HEIGHT) & (y < height)]
+
+        # start and end labels are always drawn and placed first
+        taken_cells = set()
+        for (_, _, extent), (x, y) in zip(self.special_labels, screen_xy[:number_of_special].tolist()):
+            taken_cells.update(self.label_cells(x - mvp.dx(), y - mvp.dy(), extent))
+
+        painter.setPen(self.text_pen)
+        for room_id, (x, y) in zip(rooms[candidates].tolist(), screen_xy[candidates].tolist()):
+            label, extent = self.room_label(room_id)
+            label_cells = self.label_cells(x - mvp.dx(), y - mvp.dy(), extent)
+            if taken_cells.isdisjoint(label_cells):
+                taken_cells.update(label_cells)
+                painter.drawStaticText(QPointF(x, y) + label_offset, label)
+
+        painter.setPen(self.special_text_pen)
+        for (_, label, _), (x, y) in zip(self.special_labels, screen_xy[:number_of_special].tolist()):
+            painter.drawStaticText(QPointF(x, y) + label_offset, label)
+
+    def label_cells(self, x, y, extent):
+        "label grid cells covered by text of label of room at x y from map origin on screen"
+        text_width, text_height = extent
+        top = y + self.label_offset.y()
+
+        columns = range(math.floor((x - text_width / 2) / LABEL_CELL_WIDTH),
+                        math.floor((x + text_width / 2) / LABEL_CELL_WIDTH) + 1)
+        rows = range(math.floor(top / LABEL_CELL_HEIGHT), math.floor((top + text_height) / LABEL_CELL_HEIGHT) + 1)
+
+        return [(column, row) for column in columns for row in rows]
+
+    def create_labels(self):
+        "room labels are laid out once and cached, only labels of drawn rooms are created"
+        self.label_font = QFont()
+        self.label_font.setPixelSize(14)
+        self.label_font.setBold(True)
+
+        self.room_labels = {}
+        self.special_labels = []  # (room id, label, extent) of start and end rooms
+        self.label_metrics = QFontMetrics(self.label_font)
+
+        # label line is centered vertically in room size height under the room
+        line_height = QFontMetrics(self.label_font).height()
+        self.label_offset = QPointF(-LABEL_WIDTH / 2, self.room_size / 2 + (self.room_size - line_height) / 2)
+
+        room_names = self.map.room_names
+        if self.map.error or not room_names:
+            return
+
+        for room_id, tag in ((self.map.start_index, "<start>"), (self.map.end_index, "</end>")):
+            if room_id is not None:
+                lines = [room_names[room_id], tag]
+                label = self.create_static_text("<br>".join(html.escape(line) for line in lines), Qt.RichText)
+                self.special_labels.append((room_id, label, self.label_extent(label, lines)))
+
+    def create_static_text(self, text, text_format=Qt.PlainText):
+        "prepared text centered horizontally in label width"
+        static_text = QStaticText(text)
+        static_text.setTextFormat(text_format)
+        static_text.setTextWidth(LABEL_WIDTH)
+        static_text.setTextOption(QTextOption(Qt.AlignHCenter))
+        static_text.setPerformanceHint(QStaticText.AggressiveCaching)
+        static_text.prepare(QTransform(), self.label_font)
+
+        return static_text
+
+    def label_extent(self, static_text, lines):
+        "(width, height) of label text: text is centered in label width and long lines wrap"
+        text_width = max(self.label_metrics.horizontalAdvance(line) for line in lines)
+        size = static_text.size()
+
+        return (min(text_width, size.width()), size.height())
+
+    def room_label(self, room_id):
+        "cached label of room and its extent"
+        label = self.room_labels.get(room_id)
+        if label is None:
+            room_name = self.map.room_names[room_id]
+            static_text = self.create_static_text(room_name)
+            label = self.room_labels[room_id] = (static_text, self.label_extent(static_text, [room_name]))
+
+        return label
+
+
+def lines_path(coords, link_array):
+    "all links in one QPainterPath"
+    path = QPainterPath()
+
+    coords = coords.tolist()
+    for from_id, to_id in link_array.tolist():
+        from_x, from_y = coords[from_id]
+        to_x, to_y = coords[to_id]
+
+        path.moveTo(from_x, from_y)
+        path.lineTo(to_x, to_y)
+
+    return path
+
+
+def polyline_path(points):
+    path = QPainterPath()
+
+    points = points.tolist()
+    if points:
+        path.moveTo(*points[0])
+    for x, y in points[1:]:
+        path.lineTo(x, y)
+
+    return path
@@ -0,0 +1,215 @@
+import re
+from dataclasses import dataclass, field
+
+import numpy as np
+
+from lemin_vis.input_reader import extract_map_and_solution, iter_lines
+from lemin_vis.map_parser import parse_map_str, count_lines
+from lemin_vis.solution_parser import split_solution_moves
+
+# one ant move of a solution line, room names never have "-" in them
+MOVE_RE = re.compile(r'L([0-9]+)-([^-]+)$')
+
+
+@dataclass
+class CheckResult:
+    "outcome of solution check, error is the first broken rule"
+    number_of_turns: int = 0
+    number_of_moves: int = 0
+    error: str = None
+    line_number: int = None  # input line of error if it belongs to one
+    map: object = field(default=None, repr=False)  # parsed map of checked input
+
+    @property
+    def valid(self):
+        return self.error is None
+
+
+class SolutionViolation(Exception):
+    "solution breaks lem-in rules on given input line"
+    def __init__(self, message, line_number=None):
+        super().__init__(message)
+        self.line_number = line_number
+
+
+def check_input(input_data):
+    "check map-solution input buffer: map is parsed, then every move of solution is checked"
+    try:
+        map_data, solution_data = extract_map_and_solution(input_data)
+    except Exception:
+        return CheckResult(error="ExtractionError: could not separate map data from solution data")
+
+    try:
+        map = parse_map_str(map_data)
+    except Exception as ex:
+        return CheckResult(error=f"MapParseError: {repr(ex)}")
+
+    # solution begins at line start, right after last map line
+    result = check_solution(solution_data, map, count_lines(map_data))
+    result.map = map
+
+    return result
+
+
+def check_solution(solution_data, map, first_line_number=1):
+    """
+        validate solution against map by lem-in rules and count its turns,
+        solution lines are numbered from first_line_number in reported errors
+    """
+    if isinstance(solution_data, str):
+        solution_data = solution_data.encode()
+
+    # map parser accepts maps without start or end room, ants have nowhere to go then
+    if map.start_index is None or map.end_index is None:
+        missing = "##start" if map.start_index is None else "##end"
+        return CheckResult(error=f"MapParseError: map has no {missing} room")
+
+    result = CheckResult()
+
+    try:
+        moves = split_solution_moves(solution_data, map.room_name_array, map.number_of_ants)
+
+        # line by line parse finds the line of a format error
+        if moves is None:
+            moves = split_solution_lines(iter_lines(solution_data), map)
+
+        moves, result.number_of_turns = moves
+        result.number_of_moves = len(moves)
+
+        violation = first_violation(map, moves, result.number_of_turns)
+        if violation is not None:
+            # ants which do not reach end room are reported on the last line
+            move_index, message = violation
+            line = moves[move_index, 0] if move_index < len(moves) else (result.number_of_turns or None)
+            raise SolutionViolation(message, line)
+    except SolutionViolation as ex:
+        result.error = f"SolutionError: {ex}"
+        if ex.line_number is not None:
+            result.line_number = first_line_number + int(ex.line_number) - 1
+            result.error = f"SolutionError: line {result.line_number}: {ex}"
+
+    return result
+
+
+def split_solution_lines(solution_lines, map):
+    """
+        move table (rows of line, ant index, room id) and number of lines parsed one line at a time,
+        SolutionViolation is raised on the first line which is not "L<ant>-<room> ..."
+    """
+    room_ids = map.room_ids
+    moves = []
+    number_of_lines = 0
+    blank_line = None
+
+    for line_number, line in enumerate(solution_lines, 1):
+        # spaces around moves are accepted like by visualization line parser
+        line = line.strip()
+
+        # empty lines are allowed after the last turn only
+        if not line:
+            blank_line = blank_line or line_number
+            continue
+        if blank_line is not None:
+            raise SolutionViolation("empty line between turns", blank_line)
+        if line.startswith('ERROR'):
+            raise SolutionViolation(f"resolver reported {line!r}", line_number)
+
+        for token in line.split(' '):
+            move = MOVE_RE.match(token)
+            if move is None:
+                raise SolutionViolation(f"{token!r} is not a move like L<ant>-<room>", line_number)
+
+            ant_number, room_name = int(move.group(1)), move.group(2)
+            if not 1 <= ant_number <= map.number_of_ants:
+                raise SolutionViolation(f"{token!r}: there is no ant L{ant_number}, "
+                                        f"map has {map.number_of_ants} ants", line_number)
+            if room_name not in room_ids:
+                raise SolutionViolation(f"{token!r}: there is no room {room_name!r}", line_number)
+
+            moves.append((line_number, ant_number - 1, room_ids[room_name]))
+
+        number_of_lines = line_number
+
+    return (np.array(moves, dtype=np.int32).reshape(-1, 3), number_of_lines)
+
+
+def first_violation(map, moves, number_of_turns):
+    """
+        every rule is checked for all moves at once,
+        return (index of the first invalid move, description) or None if solution is valid,
+        index is len(moves) for ants which do not reach end room
+    """
+    move_turns, move_ants, move_rooms = moves.T.astype(np.int64)
+    number_of_moves = len(moves)
+    start, end = map.start_index, map.end_index
+    room_names = map.room_names
+    violations = []
+
+    def report(move_indices, describe):
+        if len(move_indices):
+            first = int(move_indices.min())
+            violations.append((first, describe(first)))
+
+    # moves of every ant in turn order, ant leaves start room or room of its previous move
+    ant_order = np.argsort(move_ants, kind='stable')
+    ant_rooms = move_rooms[ant_order]
+    ant_turns = move_turns[ant_order]
+    first_move = np.ones(number_of_moves, dtype=bool)
+    first_move[1:] = move_ants[ant_order][1:] != move_ants[ant_order][:-1]
+    last_move = np.roll(first_move, -1)
+
+    # ant moves once per turn
+    repeated = ant_order[1:][~first_move[1:] & (ant_turns[1:] == ant_turns[:-1])]
+    report(repeated, lambda i: f"ant L{move_ants[i] + 1} moves twice in turn {move_turns[i]}")
+
+    from_rooms = np.empty(number_of_moves, dtype=np.int64)
+    from_rooms[ant_order] = np.where(first_move, start, np.roll(ant_rooms, 1))
+
+    report(np.flatnonzero(from_rooms == end),
+           lambda i: f"ant L{move_ants[i] + 1} moves on after reaching end room")
+
+    # ant goes through a link from the room it is in, links are sorted 64 bit keys like in map parser
+    link_pairs = np.sort(map.link_array.astype(np.int64), axis=1)
+    link_keys = np.sort(link_pairs[:, 0] << 32 | link_pairs[:, 1])
+    move_keys = np.minimum(from_rooms, move_rooms) << 32 | np.maximum(from_rooms, move_rooms)
+
+    # keys are looked up in sorted order, random order lookups are several times slower
+    linked = np.zeros(number_of_moves, dtype=bool)
+    if len(link_keys):
+        key_order = np.argsort(move_keys)
+        sorted_keys = move_keys[key_order]
+        positions = np.minimum(np.searchsorted(link_keys, sorted_keys), len(link_keys) - 1)
+        linked[key_order] = link_keys[positions] == sorted_keys
+    report(np.flatnonzero(~linked | (from_rooms == move_rooms)),
+           lambda i: f"ant L{move_ants[i] + 1} moves from {room_names[from_rooms[i]]} "
+                     f"to {room_names[move_rooms[i]]} without a link between them")
+
+    # ant stays in a room from its move there until its next move,
+    # stays of ants in the same room other than start and end room must not overlap
+    leave_turns = np.empty(number_of_moves, dtype=np.int64)
+    leave_turns[ant_order] = np.where(last_move, number_of_turns + 1, np.roll(ant_turns, -1))
+
+    inner = np.flatnonzero((move_rooms != start) & (move_rooms != end))
+    if len(inner):
+        # stays ordered by room then turn, room offset keeps turns of different rooms apart
+        room_offsets = move_rooms[inner] * (number_of_turns + 2)
+        stay_order = np.argsort(room_offsets + move_turns[inner])
+        stays, room_offsets = inner[stay_order], room_offsets[stay_order]
+
+        # latest leave turn of earlier stays in the same room
+        latest_leave = np.maximum.accumulate(leave_turns[stays] + room_offsets)
+        overlaps = stays[1:][move_turns[stays[1:]] + room_offsets[1:] < latest_leave[:-1]]
+        report(overlaps, lambda i: f"ant L{move_ants[i] + 1} enters {room_names[move_rooms[i]]} "
+                                   f"which is taken by another ant")
+
+    # every ant ends in end room
+    last_rooms = np.full(map.number_of_ants, start, dtype=np.int64)
+    last_rooms[move_ants[ant_order][last_move]] = ant_rooms[last_move]
+    unfinished = np.flatnonzero(last_rooms != end)
+    if len(unfinished):
+        ant = int(unfinished[0])
+        where = "never leaves start room" if last_rooms[ant] == start else \
+            f"stops in {room_names[last_rooms[ant]]}"
+        violations.append((number_of_moves, f"ant L{ant + 1} {where}, {len(unfinished)} ants do not reach end room"))
+
+    return min(violations, default=None, key=lambda violation: violation[0])
@@ -1,19 +1,14 @@
 from dataclasses import dataclass
-from functools import reduce
-from operator import xor
-from itertools import tee
-from collections import OrderedDict
-from io import StringIO
+from threading import RLock
 
-from lemin_vis.map_parser import Link
+import numpy as np
 
+from lemin_vis.input_reader import iter_lines
+from lemin_vis.map_parser import gather_names, lookup_room_ids
+from lemin_vis.path_trie import PathTrie, intern_paths
 
-def mix(x, y, a):
-    """
-        linear blend between two values,
-        'a' in [0 1]
-    """
-    return x*(1 - a) + y*a
+# bytes never found in common format solution lines
+NOT_IN_SOLUTION = np.frombuffer(b'\t\r\v\f#', dtype=np.uint8)
 
 
 @dataclass
@@ -24,61 +19,78 @@ class Rect:
     right: int
 
 
-# encapsulates links that comprise solution path for a given ant
-@dataclass
-class Path:
-    links: list
+class Solution:
+    """
+        ant timeline table: room index of every ant on every step,
+        stored step-major (one contiguous row of ants per step)
+        so a whole step is read or written at once,
+        rows past the last ant move repeat the room ant stays in
+    """
 
-    def __hash__(self):
-        return reduce(xor, (hash(link) for link in self.links), 0)
+    def __init__(self):
+        self.number_of_ants: int = 0
+        self.number_of_steps: int = 0
+        self.error: str = None
+        self.rect: Rect = None
+        self.all_rooms = set()  # ids of rooms ants pass through except for start and end rooms
+        self.float_step = 0.0
+        self.complete = False  # False while solution steps are still being streamed in
 
-    def __eq__(self, other):
-        return len(self.links) == len(other.links) and all(l1 == l2 for l1, l2 in zip(self.links, other.links))
+        self.room_xy = np.zeros((0, 2))  # room id -> room coordinates
+        self.start_room_index: int = 0
 
+        # steps x ants matrix of room indices, has extra capacity for appended steps,
+        # CompactTimeline if every ant moves on every step from its departure to the end room
+        self.timeline = np.zeros((0, 0), dtype=np.int32)
 
-class Ant:
-    def __init__(self, start_room):
-        self.steps = OrderedDict()  # steps should be stored in order of being added
-        self.path = Path([])
+        # unique room sequences ants pass through starting from start room,
+        # path id of every ant and step of its first move
+        self._paths: list = []
+        self._ant_path_ids = np.zeros(0, dtype=np.int32)
+        self.ant_departures = np.zeros(0, dtype=np.int32)
 
-        self.start_room = start_room
-        self.current_room = start_room
-        self.next_room = start_room
+        # interns paths while steps are added line by line
+        self.path_trie: PathTrie = None
 
-        self.x = start_room.coords.x
-        self.y = start_room.coords.y
+        # rows of step, ant index, room id for every ant move, sorted by step
+        self.moves = np.zeros((0, 3), dtype=np.int32)
 
-    def set_step(self, step):
-        if int(step) not in self.steps:
-            return
+        # x y of every ant for current step, updated in place by set_step
+        self.positions = np.zeros((0, 2))
+        self._next_positions = np.zeros((0, 2))
 
-        self.compute_position(step)
+        # guards solution while steps are appended from background thread
+        self.lock = RLock()
 
-    def compute_position(self, step):
-        integer_step = int(step)
-        self.current_room = self.steps[integer_step]
+    def __getstate__(self):
+        "lock is not sent to other processes"
+        state = self.__dict__.copy()
+        del state['lock']
+        return state
 
-        next_step = integer_step + 1
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.lock = RLock()
 
-        self.next_room = self.steps[next_step] if next_step in self.steps else self.current_room
+    @property
+    def paths(self):
+        if self.path_trie is not None:
+            self._paths, self._ant_path_ids = self.path_trie.paths()
 
-        blend_coef = step - integer_step
+        return self._paths
 
-        # linear interpolation between room coordinates
-        self.x = mix(self.current_room.coords.x,
-                     self.next_room.coords.x, blend_coef)
-        self.y = mix(self.current_room.coords.y,
-                     self.next_room.coords.y, blend_coef)
+    @property
+    def ant_path_ids(self):
+        if self.path_trie is not None:
+            self._paths, self._ant_path_ids = self.path_trie.paths()
 
+        return self._ant_path_ids
 
-class Solution:
-    def __init__(self):
-        self.ants: dict = {}
-        self.number_of_steps: int = 0
-        self.error: str = None
-        self.rect: Rect = None
-        self.all_rooms = set()
-        self.float_step = 0.0
+    @property
+    def ant_paths(self):
+        "path of every ant, ants with the same path share one list"
+        paths = self.paths
+        return [paths[path_id] for path_id in self.ant_path_ids.tolist()]
 
     def set_step(self, step):
         """
@@ -87,13 +99,48 @@ class Solution:
             ants position is interpolated between rooms on steps e.g. [1 2]
         """
         self.float_step = step
-        for ant in self.ants.values():
-            ant.set_step(step)
+
+        if self.number_of_steps == 0:
+            return
+
+        last_step = self.number_of_steps - 1
+        integer_step = min(max(int(step), 0), last_step)
+        next_step = min(integer_step + 1, last_step)
+        blend_coef = step - int(step)
+
+        # linear interpolation between room coordinates for all ants at once
+        positions = self.positions
+        next_positions = self._next_positions
+        np.take(self.room_xy, self.timeline[integer_step], axis=0, out=positions)
+        np.take(self.room_xy, self.timeline[next_step], axis=0, out=next_positions)
+
+        next_positions -= positions
+        next_positions *= blend_coef
+        positions += next_positions
 
     def move_ants_to_start(self):
-        for ant in self.ants.values():
-            ant.x = ant.start_room.coords.x
-            ant.y = ant.start_room.coords.y
+        if self.number_of_ants:
+            self.positions[:] = self.room_xy[self.start_room_index]
+
+    def add_step_row(self):
+        "append step where all ants stay in rooms of previous step, return its row"
+        step = self.number_of_steps
+
+        # grow table capacity twice when full
+        if step == len(self.timeline):
+            timeline = np.empty((2 * step, self.number_of_ants), dtype=np.int32)
+            timeline[:step] = self.timeline
+            self.timeline = timeline
+
+        row = self.timeline[step]
+        row[:] = self.timeline[step - 1]
+
+        return row
+
+    def freeze_paths(self):
+        "stop interning, paths are final when all steps are added"
+        self._paths, self._ant_path_ids = self.paths, self.ant_path_ids
+        self.path_trie = None
 
     # used for movement animation only
     # to determine if ants reached step or they are in transition between steps (rooms)
@@ -105,111 +152,297 @@ class Solution:
             return self.float_step <= int_step
 
 
-def parse_solution_str(solution_str, map):
-    solution_buf = StringIO(solution_str)
-    solution = Solution()
+class CompactTimeline:
+    """
+        timeline rows computed from ant paths and departures instead of being stored:
+        ant which departed on step d is in room k of its path on step d + k - 1,
+        valid when ants never wait on their way to the end room
+    """
 
-    # create ants
-    for i in range(map.number_of_ants):
-        ant_id = str(i+1)  # ant numbers start with 1 not 0
-        solution.ants[ant_id] = Ant(map.start_room)
+    def __init__(self, paths, ant_path_ids, ant_departures, number_of_steps):
+        path_lengths = np.array([len(path) for path in paths], dtype=np.int64)
+        path_offsets = np.cumsum(path_lengths) - path_lengths
 
-    # parse solution file
-    solution_step = 1
+        self.path_rooms = np.array([room_id for path in paths for room_id in path], dtype=np.int32)
+        self.ant_offsets = path_offsets[ant_path_ids]
+        self.ant_last_rooms = path_lengths[ant_path_ids] - 1
+        self.ant_departures = ant_departures
+        self.number_of_steps = number_of_steps
 
-    for line in solution_buf:
-        if line.startswith('ERROR'):
-            raise Exception(line)
+    def __len__(self):
+        return self.number_of_steps
 
-        # eliminate trailing \n
-        line = line.strip()
+    def __getitem__(self, step):
+        path_positions = np.clip(step - self.ant_departures + 1, 0, self.ant_last_rooms)
+        return self.path_rooms[self.ant_offsets + path_positions]
 
-        ants_per_line = line.split(' ')
-        for ant_state in ants_per_line:
-            # separate ant name from room
-            separated_data = ant_state.split('-')
 
-            # [1:] to discard "L" in ant name like "L1"
-            ant_id = separated_data[0][1:]
+def ants_never_wait(ant_steps, moves_per_ant, ant_departures):
+    "every ant moves on each step from its departure on, ant steps are ordered by ant"
+    ant_offsets = np.cumsum(moves_per_ant) - moves_per_ant
+    move_numbers = np.arange(len(ant_steps)) - np.repeat(ant_offsets, moves_per_ant)
 
-            room_name = separated_data[1]
+    return np.array_equal(ant_steps - np.repeat(ant_departures, moves_per_ant), move_numbers)
 
-            solution.ants[ant_id].steps[solution_step] = map.rooms[room_name]
 
-        solution_step += 1
+def parse_solution_str(solution_data, map):
+    "solution_data is str or bytes-like buffer (e.g. memoryview of input)"
+    if isinstance(solution_data, str):
+        solution_data = solution_data.encode()
 
-    solution.number_of_steps = solution_step
+    moves = split_solution_moves(solution_data, map.room_name_array, map.number_of_ants)
 
-    # additional processing for visualization
-    # add initial step to each ant where they start from start room
-    ants_add_initial_step(solution, map)
+    # line parser handles unusual input and errors
+    if moves is None:
+        return parse_solution_lines(iter_lines(solution_data), map)
 
-    ants_add_solution_paths(solution, map)
+    moves, number_of_lines = moves
 
-    solution.all_rooms = find_all_rooms(solution, map)
+    return build_solution(map, moves, number_of_lines + 1)
 
-    solution.rect = find_solution_rect(solution)
+
+def split_solution_moves(solution_data, room_name_array, number_of_ants):
+    """
+        bulk solution parser: all "L<ant>-<room>" tokens are split by numpy at once,
+        ant numbers are decoded and room names resolved to room ids in one batch
+        return move table (rows of step, ant index, room id) and number of solution lines
+        or None if input is not in the common format or is invalid,
+        line parser should be used then
+    """
+    data = np.frombuffer(solution_data, dtype=np.uint8)
+    if len(data) == 0 or np.isin(data, NOT_IN_SOLUTION).any():
+        return None
+
+    # tokens are separated by spaces and line breaks
+    newlines = np.flatnonzero(data == ord('\n'))
+    separators = np.concatenate(([True], (data == ord(' ')) | (data == ord('\n')), [True]))
+    token_bounds = np.flatnonzero(separators[1:] != separators[:-1])
+    token_starts, token_ends = token_bounds[0::2], token_bounds[1::2]
+
+    # every line has tokens separated by single spaces, no leading spaces
+    number_of_lines = len(newlines) + (data[-1] != ord('\n'))
+    token_lines = np.searchsorted(newlines, token_starts)
+    first_in_line = np.concatenate(([True], token_lines[1:] != token_lines[:-1]))
+
+    if not np.array_equal(token_lines[first_in_line], np.arange(number_of_lines)):
+        return None
+    line_starts = np.concatenate(([0], newlines + 1))
+    if np.any(token_starts[first_in_line] != line_starts[token_lines[first_in_line]]):
+        return None
+    if np.any(token_starts[~first_in_line] - token_ends[np.flatnonzero(~first_in_line) - 1] != 1):
+        return None
+
+    # every token is "L<digits>-<room name>" with single "-"
+    dashes = np.flatnonzero(data == ord('-'))
+    if len(dashes) != len(token_starts):
+        return None
+    if np.any(data[token_starts] != ord('L')):
+        return None
+    if not np.all((token_starts + 1 < dashes) & (dashes + 1 < token_ends)):
+        return None
+
+    ant_numbers = decode_numbers(data, token_starts + 1, dashes)
+    if ant_numbers is None or np.any((ant_numbers < 1) | (ant_numbers > number_of_ants)):
+        return None
+
+    room_ids = lookup_room_ids(gather_names(data, dashes + 1, token_ends), room_name_array)
+    if room_ids is None:
+        return None
+
+    # ant numbers start with 1 not 0
+    moves = np.column_stack((token_lines + 1, ant_numbers - 1, room_ids)).astype(np.int32)
+
+    return (moves, number_of_lines)
+
+
+def decode_numbers(data, starts, ends):
+    "vectorized int() of decimal numbers in [start end) byte ranges, None if not a number"
+    lengths = ends - starts
+    if np.any(lengths > 9):
+        return None
+
+    numbers = np.zeros(len(starts), dtype=np.int64)
+    for i in range(int(lengths.max(initial=0))):
+        in_number = i < lengths
+        digits = data[np.minimum(starts + i, len(data) - 1)].astype(np.int64) - ord('0')
+        if np.any(in_number & ((digits < 0) | (digits > 9))):
+            return None
+
+        numbers = np.where(in_number, numbers * 10 + digits, numbers)
+
+    return numbers
+
+
+def build_solution(map, moves, number_of_steps):
+    """
+        create solution from move table (rows of step, ant index, room id sorted by step),
+        ant paths are interned and timeline and data derived for visualization are computed in one sweep
+    """
+    solution = create_solution(map)
+    number_of_ants = solution.number_of_ants
+    start_room_index = solution.start_room_index
+
+    move_steps, move_ants, move_rooms = moves.T
+
+    moves_per_ant = np.bincount(move_ants, minlength=number_of_ants)
+    never_moved = np.flatnonzero(moves_per_ant == 0)
+    if len(never_moved):
+        raise Exception(f"ant L{never_moved[0] + 1} never leaves start room")
+
+    # moves of every ant in step order
+    ant_order = np.argsort(move_ants, kind='stable')
+    ant_steps = move_steps[ant_order]
+    ant_rooms = move_rooms[ant_order]
+
+    solution._paths, solution._ant_path_ids = intern_paths(start_room_index, ant_rooms, moves_per_ant)
+    solution.path_trie = None
+    solution.ant_departures = ant_steps[np.cumsum(moves_per_ant) - moves_per_ant].astype(np.int32)
+
+    if ants_never_wait(ant_steps, moves_per_ant, solution.ant_departures):
+        timeline = CompactTimeline(solution.paths, solution.ant_path_ids, solution.ant_departures, number_of_steps)
+    else:
+        # timeline: every step starts from previous step rooms, then moved ants are updated
+        timeline = np.empty((number_of_steps, number_of_ants), dtype=np.int32)
+        timeline[0] = start_room_index
+        step_bounds = np.searchsorted(move_steps, np.arange(number_of_steps + 1))
+
+        for step in range(1, number_of_steps):
+            begin, end = step_bounds[step], step_bounds[step + 1]
+            timeline[step] = timeline[step - 1]
+            timeline[step, move_ants[begin:end]] = move_rooms[begin:end]
+
+    solution.timeline = timeline
+    solution.number_of_steps = number_of_steps
+    solution.moves = moves
+
+    solution_add_rooms(solution, np.unique(move_rooms), map)
+    solution.complete = True
 
     return solution
 
 
-def ants_add_initial_step(solution, map):
-    for ant in solution.ants.values():
-        first_step = min(ant.steps.keys())
-        zero_step = first_step - 1
-        ant.steps[zero_step] = map.start_room
-        # move zero step to the begining of the steps
-        ant.steps.move_to_end(zero_step, False)
+def parse_solution_lines(solution_lines, map):
+    solution = create_solution(map)
 
+    # parse solution file
+    for line in solution_lines:
+        add_solution_line(solution, line, map)
 
-def pairwise(iterable):
-    "# taken from https://docs.python.org/3/library/itertools.html"
-    "s -> (s0,s1), (s1,s2), (s2, s3), ..."
-    a, b = tee(iterable)
-    next(b, None)
-    return zip(a, b)
+    finish_solution(solution)
 
+    return solution
 
-def ants_add_solution_paths(solution, map):
-    for ant in solution.ants.values():
-        path = ant.path
-        for from_room, to_room in pairwise(ant.steps.values()):
-            link = Link(from_room, to_room)
-            path.links.append(link)
 
+def create_solution(map):
+    "create solution with all ants waiting in start room and no steps parsed yet"
+    solution = Solution()
 
-def find_solution_rect(solution):
-    "find rect that encloses all solution rooms"
-    top = float('+inf')
-    left = float('+inf')
-    bottom = float('-inf')
-    right = float('-inf')
+    solution.room_xy = map.room_coords.astype(np.float64)
 
-    for ant in solution.ants.values():
-        for room in ant.steps.values():
-            if room.coords.y < top:
-                top = room.coords.y
-            elif room.coords.y > bottom:
-                bottom = room.coords.y
+    # create ants
+    solution.number_of_ants = number_of_ants = map.number_of_ants
+    start_room_index = map.start_index if number_of_ants else 0
+    solution.start_room_index = start_room_index
+    solution.path_trie = PathTrie(start_room_index, number_of_ants)
+    solution.ant_departures = np.zeros(number_of_ants, dtype=np.int32)
 
-            if room.coords.x < left:
-                left = room.coords.x
-            elif room.coords.x > right:
-                right = room.coords.x
+    # only initial step 0 is known: all ants are in start room
+    solution.timeline = np.full((16, number_of_ants), start_room_index, dtype=np.int32)
+    solution.number_of_steps = 1
 
-    return Rect(top, left, bottom, right)
+    solution.positions = np.empty((number_of_ants, 2))
+    solution._next_positions = np.empty((number_of_ants, 2))
+    solution.move_ants_to_start()
 
+    if number_of_ants:
+        solution_add_rooms(solution, [start_room_index], map)
 
-def find_all_rooms(solution, map):
-    # build a set of all rooms that belongs to solution paths
-    # except for start and end rooms - they will be drawn special way
-    all_solution_rooms = set()
+    return solution
 
-    for ant in solution.ants.values():
-        for room in ant.steps.values():
-            if room is map.start_room or room is map.end_room:
-                continue
-            else:
-                all_solution_rooms.add(room)
 
-    return all_solution_rooms
+def add_solution_line(solution, line, map):
+    """
+        append next solution step from "L<ant>-<room> ..." line,
+        data derived for visualization (paths, solution rooms and rect)
+        is updated as well so solution is ready to be shown after every line
+    """
+    if line.startswith('ERROR'):
+        raise Exception(line)
+
+    # eliminate trailing \n
+    line = line.strip()
+
+    step_row = solution.add_step_row()
+    number_of_ants = solution.number_of_ants
+    room_ids = map.room_ids
+    step_rooms = []
+
+    ants_per_line = line.split(' ')
+    for ant_state in ants_per_line:
+        # separate ant name from room
+        separated_data = ant_state.split('-')
+
+        # [1:] to discard "L" in ant name like "L1"
+        # ant numbers start with 1 not 0
+        ant_index = int(separated_data[0][1:]) - 1
+        if not 0 <= ant_index < number_of_ants:
+            raise KeyError(separated_data[0])
+
+        room_name = separated_data[1]
+        room_id = room_ids[room_name]
+
+        step_row[ant_index] = room_id
+        step_rooms.append(room_id)
+
+        if solution.ant_departures[ant_index] == 0:
+            solution.ant_departures[ant_index] = solution.number_of_steps
+        solution.path_trie.move_ant(ant_index, room_id)
+
+    solution_add_rooms(solution, step_rooms, map)
+
+    # publish step only after all ants are moved
+    solution.number_of_steps += 1
+
+
+def finish_solution(solution):
+    "called when all solution lines are added"
+    never_moved = np.flatnonzero(solution.ant_departures == 0)
+    if len(never_moved):
+        raise Exception(f"ant L{never_moved[0] + 1} never leaves start room")
+
+    # recover move table from timeline: ant moves where its room changes
+    timeline = solution.timeline[:solution.number_of_steps]
+    steps, ants = np.nonzero(timeline[1:] != timeline[:-1])
+    solution.moves = np.column_stack((steps + 1, ants, timeline[steps + 1, ants])).astype(np.int32)
+
+    solution.freeze_paths()
+
+    # stored timeline is not needed if it can be computed from paths
+    ant_order = np.argsort(solution.moves[:, 1], kind='stable')
+    moves_per_ant = np.bincount(solution.moves[:, 1], minlength=solution.number_of_ants)
+    if ants_never_wait(solution.moves[ant_order, 0], moves_per_ant, solution.ant_departures):
+        solution.timeline = CompactTimeline(solution.paths, solution.ant_path_ids,
+                                            solution.ant_departures, solution.number_of_steps)
+
+    solution.complete = True
+
+
+def solution_add_rooms(solution, room_ids, map):
+    "extend solution rect and set of solution rooms with rooms visited by ants"
+    coords = map.room_coords[room_ids]
+    left, top = coords.min(axis=0).tolist()
+    right, bottom = coords.max(axis=0).tolist()
+
+    rect = solution.rect
+    if rect is None:
+        solution.rect = Rect(top, left, bottom, right)
+    else:
+        rect.top = min(rect.top, top)
+        rect.left = min(rect.left, left)
+        rect.bottom = max(rect.bottom, bottom)
+        rect.right = max(rect.right, right)
+
+    # start and end rooms are not included - they will be drawn special way
+    solution.all_rooms.update(room_ids)
+    solution.all_rooms.discard(map.start_index)
+    solution.all_rooms.discard(map.end_index)
@@ -0,0 +1,117 @@
+import math
+
+import numpy as np
+
+# links spanning more grid cells are not stored in cells but tested on every query
+MAX_LINK_CELLS = 64
+
+
+class SpatialGrid:
+    """
+        uniform grid over map rooms and links built once from map arrays,
+        answers which rooms and links are inside of a rect (e.g. visible part of the map)
+        items of every cell are stored contiguously, cells of one grid row follow each other
+        so a rect query reads one slice per grid row
+    """
+
+    def __init__(self, room_coords, link_array):
+        self.room_coords = room_coords
+        self.link_array = link_array
+
+        if len(room_coords):
+            self.left, self.top = room_coords.min(axis=0).tolist()
+            self.right, self.bottom = room_coords.max(axis=0).tolist()
+        else:
+            self.left, self.top, self.right, self.bottom = 0, 0, 0, 0
+        right, bottom = self.right, self.bottom
+
+        # about one room per cell
+        cells_per_side = min(max(int(math.sqrt(len(room_coords))), 1), 1024)
+        self.cell_width = max((right - self.left) / cells_per_side, 1)
+        self.cell_height = max((bottom - self.top) / cells_per_side, 1)
+        self.columns = int((right - self.left) // self.cell_width) + 1
+        self.rows = int((bottom - self.top) // self.cell_height) + 1
+
+        # rooms sorted by cell
+        room_cells = self.cell_of(room_coords[:, 0], room_coords[:, 1])
+        self.room_order, self.room_offsets = self.sort_by_cell(room_cells, np.arange(len(room_coords)))
+
+        self.build_link_cells()
+
+    def cell_column(self, x):
+        return np.clip((np.asarray(x) - self.left) // self.cell_width, 0, self.columns - 1).astype(np.int64)
+
+    def cell_row(self, y):
+        return np.clip((np.asarray(y) - self.top) // self.cell_height, 0, self.rows - 1).astype(np.int64)
+
+    def cell_of(self, x, y):
+        return self.cell_row(y) * self.columns + self.cell_column(x)
+
+    def sort_by_cell(self, cells, items):
+        "return items ordered by cell and offsets of every cell in that order"
+        order = np.argsort(cells, kind='stable')
+        offsets = np.searchsorted(cells[order], np.arange(self.rows * self.columns + 1))
+
+        return (items[order], offsets)
+
+    def build_link_cells(self):
+        "put every link to all cells covered by its bounding box, long links are kept aside"
+        from_xy = self.room_coords[self.link_array[:, 0]]
+        to_xy = self.room_coords[self.link_array[:, 1]]
+
+        self.link_min = np.minimum(from_xy, to_xy)
+        self.link_max = np.maximum(from_xy, to_xy)
+
+        first_column = self.cell_column(self.link_min[:, 0])
+        first_row = self.cell_row(self.link_min[:, 1])
+        widths = self.cell_column(self.link_max[:, 0]) - first_column + 1
+        heights = self.cell_row(self.link_max[:, 1]) - first_row + 1
+
+        cell_counts = widths * heights
+        is_long = cell_counts > MAX_LINK_CELLS
+        self.long_links = np.flatnonzero(is_long)
+
+        # enumerate (cell, link) pairs of all short links at once
+        short_links = np.flatnonzero(~is_long)
+        counts = cell_counts[short_links]
+        link_of_pair = np.repeat(short_links, counts)
+        pair_index = np.arange(len(link_of_pair)) - np.repeat(np.cumsum(counts) - counts, counts)
+
+        pair_widths = widths[link_of_pair]
+        pair_columns = first_column[link_of_pair] + pair_index % pair_widths
+        pair_rows = first_row[link_of_pair] + pair_index // pair_widths
+
+        self.link_order, self.link_offsets = self.sort_by_cell(pair_rows * self.columns + pair_columns,
+                                                               link_of_pair)
+
+    def cell_items(self, items, offsets, left, top, right, bottom):
+        "items of all cells intersecting the rect, one slice per grid row"
+        first_column, last_column = self.cell_column([left, right]).tolist()
+        first_row, last_row = self.cell_row([top, bottom]).tolist()
+
+        slices = [items[offsets[row * self.columns + first_column]:offsets[row * self.columns + last_column + 1]]
+                  for row in range(first_row, last_row + 1)]
+
+        return np.concatenate(slices) if slices else items[:0]
+
+    def rooms_in_rect(self, left, top, right, bottom):
+        "ids of rooms inside the rect"
+        rooms = self.cell_items(self.room_order, self.room_offsets, left, top, right, bottom)
+        x, y = self.room_coords[rooms].T
+
+        return rooms[(x >= left) & (x <= right) & (y >= top) & (y <= bottom)]
+
+    def links_in_rect(self, left, top, right, bottom):
+        "indices of links which bounding box intersects the rect"
+        links = self.cell_items(self.link_order, self.link_offsets, left, top, right, bottom)
+        links = np.unique(np.concatenate((links, self.long_links)))
+
+        link_min, link_max = self.link_min[links], self.link_max[links]
+        intersects = (link_min[:, 0] <= right) & (link_max[:, 0] >= left) & \
+                     (link_min[:, 1] <= bottom) & (link_max[:, 1] >= top)
+
+        return links[intersects]
+
+    def contains_all(self, left, top, right, bottom):
+        "rect covers the whole map"
+        return left <= self.left and top <= self.top and right >= self.right and bottom >= self.bottom
@@ -0,0 +1,30 @@
+from threading import Thread
+from itertools import chain
+
+from lemin_vis.solution_parser import add_solution_line, finish_solution
+
+
+def stream_solution_in_background(stream, first_line, solution, map):
+    """
+        keep appending solution steps read from binary stream to given solution
+        in a daemon thread, so solution can be shown while it is being produced
+    """
+    thread = Thread(target=stream_solution,
+                    args=(stream, first_line, solution, map), daemon=True)
+    thread.start()
+
+    return thread
+
+
+def stream_solution(stream, first_line, solution, map):
+    try:
+        for line in chain((first_line,), (line.decode() for line in stream)):
+            with solution.lock:
+                add_solution_line(solution, line, map)
+
+        with solution.lock:
+            finish_solution(solution)
+    except Exception as ex:
+        # if solution parsing failed
+        with solution.lock:
+            solution.error = f"SolutionParseError: {repr(ex)}"
@@ -0,0 +1,52 @@
+from collections import OrderedDict
+
+TILE_SIZE = 256
+
+# memory allowed for cached tiles, in megabytes
+DEFAULT_TILE_CACHE_MB = 256
+
+
+class TileCache:
+    """
+        pixmap tiles of static map layers (links, rooms, solution paths)
+        keyed by zoom and tile column and row in screen pixels at that zoom,
+        least recently used tiles are dropped when tiles take more memory than budget
+    """
+
+    def __init__(self, render_tile, budget_mb=DEFAULT_TILE_CACHE_MB, tile_size=TILE_SIZE):
+        self.render_tile = render_tile  # render_tile(zoom, column, row, tile_size) -> QPixmap
+        self.budget = budget_mb * 1024 * 1024
+        self.tile_size = tile_size
+        self.tiles = OrderedDict()
+        self.memory = 0
+
+    @property
+    def enabled(self):
+        return self.budget > 0
+
+    def tile(self, zoom, column, row):
+        key = (zoom, column, row)
+
+        pixmap = self.tiles.get(key)
+        if pixmap is not None:
+            self.tiles.move_to_end(key)
+            return pixmap
+
+        pixmap = self.tiles[key] = self.render_tile(zoom, column, row, self.tile_size)
+        self.memory += pixmap_bytes(pixmap)
+
+        # the newest tile is always kept
+        while self.memory > self.budget and len(self.tiles) > 1:
+            _, old_pixmap = self.tiles.popitem(last=False)
+            self.memory -= pixmap_bytes(old_pixmap)
+
+        return pixmap
+
+    def clear(self):
+        "drop all tiles e.g. when solution paths change"
+        self.tiles.clear()
+        self.memory = 0
+
+
+def pixmap_bytes(pixmap):
+    return pixmap.width() * pixmap.height() * pixmap.depth() // 8
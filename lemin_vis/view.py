@@ -1,149 +1,89 @@
 import sys
+import time
 
-from dataclasses import dataclass
-import math
-from collections import defaultdict
-from itertools import groupby
-from operator import attrgetter
-
-from PySide2.QtWidgets import QApplication, QOpenGLWidget, QVBoxLayout, QLabel, QSizePolicy
-from PySide2.QtGui import QPainter, QPen, QBrush, QColor, QPainterPath, QTransform, QStaticText
-from PySide2.QtCore import QObject, QRect, QRectF, Qt, QPoint, QPointF, Slot, Signal
+from PySide2.QtWidgets import QApplication, QOpenGLWidget, QVBoxLayout, QLabel, QSlider
+from PySide2.QtGui import QPainter
+from PySide2.QtCore import Qt, QPoint, QPointF
 
 from lemin_vis.animation_control import SimulationState, AnimationControl
+from lemin_vis.frame_rate import DEFAULT_MAX_FPS, ADAPTIVE_PAINT_SHARE
+from lemin_vis.scene import Scene, MIN_ZOOM, MAX_ZOOM, clamp
+from lemin_vis.tile_cache import DEFAULT_TILE_CACHE_MB
+from lemin_vis.profiler import Profiler, profiled
 
-MIN_ZOOM = 0.01
-MAX_ZOOM = 200
-
-
-@dataclass
-class Camera:
-    viewport: QOpenGLWidget
-    pos: QPointF
-    zoom: float
-
-    def fit_solution_in_view(self, solution):
-        if not solution.rect:
-            return
-
-        solution_rect = QRect(QPoint(solution.rect.left, solution.rect.top),
-                              QPoint(solution.rect.right, solution.rect.bottom))
-
-        viewport_rect = self.viewport.rect()
-
-        # compute zoom level
-        if solution_rect.width() > solution_rect.height():
-            zoom = viewport_rect.width() / solution_rect.width() if viewport_rect.width() else 1
-        else:
-            zoom = viewport_rect.height() / solution_rect.height() if viewport_rect.height() else 1
-
-        self.zoom = 0.80 * zoom if zoom else 1
-        self.zoom = clamp(self.zoom, MIN_ZOOM, MAX_ZOOM)  # limit zoom level
+# seconds between updates of profiler hud text
+HUD_INTERVAL = 0.25
 
-        # center view on rect center
-        self.pos = -QPointF(solution_rect.center())
-
-
-def clamp(v, smallest, largest):
-    "limit value on both sides"
-    return max(smallest, min(v, largest))
+# seconds between rebuilds of paths and camera fit while solution is streamed in
+STREAM_REBUILD_INTERVAL = 0.5
 
 
 class View(QOpenGLWidget):  # inherit from QOpenGLWidget to enable opengl backend for QPainter
-    room_size = 28
-    ant_size = 16
-
-    def __init__(self, map, solution, parent=None):
+    def __init__(self, map, solution, parent=None, tile_cache_mb=DEFAULT_TILE_CACHE_MB,
+                 max_fps=DEFAULT_MAX_FPS, adaptive_fps=False, profiler=None, turn_bound=None):
         super().__init__(parent)
         self.setWindowTitle("lemin42 visual")
 
-        self.camera = Camera(self, QPointF(0, 0), 1)
         self.mouse_last_pos = QPoint(0, 0)
         self.map = map
         self.solution = solution
         self.steps = 0
+        self.known_steps = solution.number_of_steps  # steps already shown while solution is streamed in
+        self.camera_moved = False  # keep fitting streamed solution in view until user moves camera
+        self.path_steps = solution.number_of_steps  # steps scene paths were built from
+        self.path_nodes = self.streamed_path_nodes()
+        self.paths_time = 0.0
+        self.turn_bound = turn_bound  # future of max flow turn bound, shown when it is ready
 
-        self.create_pens()
-        self.create_link_layer()
-        self.create_solution_paths()
-
-        self.anim_control = AnimationControl(solution)
-
-        self.create_ui()
-
-        self.camera.fit_solution_in_view(solution)
-
-        # start redraw timer
-        self.startTimer(1000 / 60)  # 60 fps
-
-    def create_link_layer(self):
-        """
-            optimization: store all links in QPainterPath object
-            to draw it in one call
-        """
+        # timings of animation and draw layers of every frame
+        self.profiler = profiler if profiler is not None else Profiler()
+        self.hud_time = 0.0
 
-        self.link_layer = link_layer = QPainterPath()
+        # everything drawn in view, sized by view itself
+        self.scene = Scene(map, solution, self, tile_cache_mb, self.profiler)
+        self.camera = self.scene.camera
 
-        for link in self.map.links:
-            from_ = link.from_.coords
-            to_ = link.to_.coords
+        self.anim_control = AnimationControl(solution, profiler=self.profiler)
 
-            link_layer.moveTo(from_.x, from_.y)
-            link_layer.lineTo(to_.x, to_.y)
-
-    def create_solution_paths(self):
-        self.solution_paths = []
-
-        # group ants by paths
-        self.path_ants = defaultdict(list)
-        for ant in self.solution.ants.values():
-            self.path_ants[ant.path].append(ant)
-
-        # add ant paths to view
-        for path in self.path_ants:
-            qpath = QPainterPath()
-            for link in path.links:
-                from_ = link.from_.coords
-                to_ = link.to_.coords
-
-                qpath.moveTo(from_.x, from_.y)
-                qpath.lineTo(to_.x, to_.y)
-
-            self.solution_paths.append(qpath)
-
-    def create_pens(self):
-        pen = QPen(QColor("#33434B"), 3)
-        pen.setCosmetic(True)  # makes pen size zoom independent
-        self.link_pen = pen
-
-        pen = QPen(QColor("#5A667A"), self.room_size)
-        pen.setCosmetic(True)  # makes pen size zoom independent
-        self.room_pen = pen
-
-        pen = QPen(QColor("#FF0266"), self.ant_size)
-        pen.setCosmetic(True)  # makes pen size zoom independent
-        self.ant_pen = pen
-
-        pen = QPen(QColor("#AAAAAA"), 1)
-        self.text_pen = pen
-
-        pen = QPen(QColor("#20FF20"), 1)
-        self.special_text_pen = pen
-
-        # create path pens
-        ant_colors = ["#FF008D", "#FF00FF", "#FFE100", "#FF0000"]
-
-        self.solution_path_pens = [QPen(QColor(color).darker(100), 3)
-                                   for color in ant_colors]
-
-        for pen in self.solution_path_pens:
-            pen.setCosmetic(True)
-
-        self.ant_pens = [QPen(QColor(color), self.ant_size)
-                         for color in ant_colors]
+        self.create_ui()
 
-        for pen in self.ant_pens:
-            pen.setCosmetic(True)
+        # redraw timer runs only while something changes on screen
+        self.max_fps = max_fps
+        self.adaptive_fps = adaptive_fps
+        self.frame_cost = 0.0  # average paint time in seconds
+        self.frame_interval = self.min_frame_interval()
+        self.timer_id = 0
+        self.dirty = True
+        self.start_timer()
+
+    def min_frame_interval(self):
+        "timer interval in ms for max fps"
+        return max(int(1000 / max(self.max_fps, 1)), 1)
+
+    def start_timer(self):
+        if self.timer_id:
+            self.killTimer(self.timer_id)
+        self.timer_id = self.startTimer(self.frame_interval)
+
+    def stop_timer(self):
+        if self.timer_id:
+            self.killTimer(self.timer_id)
+            self.timer_id = 0
+
+    def request_redraw(self):
+        "repaint on next timer tick, timer is restarted if it was stopped"
+        self.dirty = True
+        if not self.timer_id:
+            self.start_timer()
+
+    def adapt_frame_rate(self):
+        "slow down timer if frames are expensive to paint"
+        frame_interval = max(self.min_frame_interval(), int(1000 * self.frame_cost / ADAPTIVE_PAINT_SHARE))
+
+        # restart timer only on noticeable change
+        if self.timer_id and abs(frame_interval - self.frame_interval) > 0.2 * self.frame_interval:
+            self.frame_interval = frame_interval
+            self.start_timer()
 
     def create_ui(self):
         alignTop = Qt.AlignTop | Qt.AlignLeft
@@ -153,25 +93,32 @@ class View(QOpenGLWidget):  # inherit from QOpenGLWidget to enable opengl backen
         self.setLayout(layout)
 
         # add error label if any errors from parsing
-        if self.map.error or self.solution.error:
-            error_lbl = QLabel(self.map.error or self.solution.error)
-            error_lbl.setObjectName("error")
-            layout.addWidget(error_lbl, 0, alignTop)
+        # solution errors may also come later while solution is streamed in
+        self.error_label = error_lbl = QLabel(self.map.error or self.solution.error or "")
+        error_lbl.setObjectName("error")
+        error_lbl.setVisible(bool(self.map.error or self.solution.error))
+        layout.addWidget(error_lbl, 0, alignTop)
 
         self.setStyleSheet("""
             QLabel {color: #eeeeee; font: 20px;}
             QLabel#error {color: #e91e63; font: 18px;}
             QLabel#second {color: #aaaaaa; font: 15px;}
+            QLabel#hud {color: #aaaaaa; font: 13px monospace;}
             """)
 
         map_params_label = QLabel(
             f"<font color=\"#e91e63\">{self.map.number_of_ants}</font> ants"
-            f" <font color=\"#e91e63\">{len(self.map.rooms)}</font> rooms"
-            f" <font color=\"#e91e63\">{len(self.map.links)}</font> links ")
+            f" <font color=\"#e91e63\">{self.map.number_of_rooms}</font> rooms"
+            f" <font color=\"#e91e63\">{self.map.number_of_links}</font> links ")
 
         map_params_label.setObjectName('second')
         layout.addWidget(map_params_label, 0, alignTop)
 
+        self.bound_label = bound_label = QLabel("")
+        bound_label.setObjectName('second')
+        bound_label.setVisible(False)
+        layout.addWidget(bound_label, 0, alignTop)
+
         state_label = QLabel("playing")
         layout.addWidget(state_label, 0, alignTop)
 
@@ -185,6 +132,17 @@ class View(QOpenGLWidget):  # inherit from QOpenGLWidget to enable opengl backen
 
         self.anim_control.stateChanged.connect(on_state_changed)
 
+        speed_label = QLabel("")
+        speed_label.setObjectName('second')
+        layout.addWidget(speed_label, 0, alignTop)
+
+        def on_speed_changed(value):
+            steps_only = " steps only" if self.anim_control.steps_only else ""
+            speed_label.setText(f'speed <font color=\"#e91e63\">x{value:g}</font>{steps_only}')
+
+        self.anim_control.speedChanged.connect(on_speed_changed)
+        on_speed_changed(self.anim_control.speed)
+
         step_label = QLabel("")
         layout.addWidget(step_label, 0, alignTop)
 
@@ -194,56 +152,180 @@ class View(QOpenGLWidget):  # inherit from QOpenGLWidget to enable opengl backen
 
         self.anim_control.stepChanged.connect(on_step_changed)
         on_step_changed(0)
+        self.update_step_label = lambda: on_step_changed(self.anim_control.step)
 
         descr_label = QLabel("""
             <font color=\"#e91e63\">Space</font> to play / pause <br>
             <font color=\"#e91e63\">D</font> next step <br>
-            <font color=\"#e91e63\">A</font> previous step
+            <font color=\"#e91e63\">A</font> previous step <br>
+            <font color=\"#e91e63\">+ / -</font> faster / slower <br>
+            <font color=\"#e91e63\">S</font> steps only <br>
+            <font color=\"#e91e63\">C</font> ant count in start / end rooms <br>
+            <font color=\"#e91e63\">P</font> profiler
             """)
         descr_label.setObjectName('second')
+
+        # frame rate, frame time percentiles and stage breakdown, toggled by key
+        self.hud_label = hud_label = QLabel("")
+        hud_label.setObjectName('hud')
+        hud_label.setTextFormat(Qt.PlainText)
+        hud_label.setVisible(False)
+        layout.addWidget(hud_label, 0, alignTop)
+
         layout.addWidget(descr_label, 1, alignBottom)
 
+        # timeline scrubber, any step is shown at once while dragging
+        self.step_slider = step_slider = QSlider(Qt.Horizontal)
+        step_slider.setFocusPolicy(Qt.NoFocus)  # keep keys for view
+        step_slider.setRange(0, max(self.solution.number_of_steps - 1, 0))
+        step_slider.setEnabled(not self.solution.error)
+        layout.addWidget(step_slider)
+
+        def on_slider_moved(value):
+            with self.solution.lock:
+                self.anim_control.goto_step(value)
+            self.request_redraw()
+
+        def on_step_changed_slider(value):
+            # programmatic change must not seek back
+            step_slider.blockSignals(True)
+            step_slider.setValue(value)
+            step_slider.blockSignals(False)
+
+        step_slider.valueChanged.connect(on_slider_moved)
+        self.anim_control.stepChanged.connect(on_step_changed_slider)
+
+    @profiled('update')
     def timerEvent(self, ev):
-        self.update()  # schedule widget repaint
-        self.anim_control.update()  # update ant animation
+        with self.solution.lock:
+            float_step = self.solution.float_step
+            self.update_streamed_solution()
+            self.update_bound_label()
+            self.anim_control.update()  # update ant animation
+
+            if self.solution.float_step != float_step:
+                self.dirty = True
+
+            # nothing will change until user input: paused and no more steps to come
+            idle = (self.anim_control.paused or self.solution.error) and \
+                   (self.solution.complete or self.solution.error) and \
+                   (self.turn_bound is None or not self.bound_label.isHidden())
+
+        if self.hud_label.isVisible() and time.perf_counter() - self.hud_time > HUD_INTERVAL:
+            self.update_hud()
+
+        if self.dirty:
+            self.dirty = False
+            self.update()  # schedule widget repaint
+        elif idle:
+            self.stop_timer()
+
+    def update_hud(self):
+        self.hud_label.setText(self.profiler.hud_text())
+        self.hud_time = time.perf_counter()
+
+    @profiled('streamed_steps')
+    def update_streamed_solution(self):
+        "pick up steps and errors that arrived since last timer event"
+        if self.solution.error and not self.error_label.isVisible():
+            self.error_label.setText(self.map.error or self.solution.error)
+            self.error_label.setVisible(True)
+            self.step_slider.setEnabled(False)
+            self.dirty = True
+
+        if self.solution.number_of_steps != self.known_steps:
+            self.dirty = True
+            self.known_steps = self.solution.number_of_steps
+            self.update_step_label()
+            if not self.bound_label.isHidden():
+                self.show_turn_bound()
+            self.step_slider.setMaximum(self.solution.number_of_steps - 1)
+
+        # rebuild under solution lock stalls parsing thread, while steps arrive it is done at most every interval
+        # and only if ants went into new rooms, paths of all steps are built once solution is finished
+        if self.path_steps == self.known_steps:
+            return
+        if not (self.solution.complete or self.solution.error):
+            if self.path_nodes == self.streamed_path_nodes():
+                return
+            if time.perf_counter() - self.paths_time < STREAM_REBUILD_INTERVAL:
+                return
 
-    def paintEvent(self, paintEvent):
-        painter = QPainter(self)
+        self.dirty = True
+        self.path_steps = self.known_steps
+        self.path_nodes = self.streamed_path_nodes()
+        self.paths_time = time.perf_counter()
 
-        font = painter.font()
-        font.setPixelSize(14)
-        font.setBold(True)
-        painter.setFont(font)
+        # solution rect grows as ants visit new rooms
+        if not self.camera_moved:
+            self.camera.fit_solution_in_view(self.solution)
 
-        # clear background
-        painter.setBackground(QColor("#1D212D"))
-        painter.eraseRect(self.rect())
+        self.scene.create_solution_paths()
 
-        self.apply_camera(painter)
+    def streamed_path_nodes(self):
+        "paths and solution rect change only with new path trie nodes, finished solution has no trie"
+        if self.solution.path_trie is None:
+            return None
 
-        self.draw_links(painter)
+        return len(self.solution.path_trie.node_rooms)
 
-        self.draw_rooms(painter)
+    def update_bound_label(self):
+        "show turn bound as soon as it is computed"
+        if self.turn_bound is None or not self.bound_label.isHidden() or not self.turn_bound.done():
+            return
 
-        self.draw_solution_paths(painter)
+        self.show_turn_bound()
+        self.bound_label.setVisible(True)
 
-        self.draw_ants(painter)
+    def show_turn_bound(self):
+        "minimum turns by max flow and how many turns solution takes above it"
+        try:
+            bound = self.turn_bound.result()
+        except Exception as ex:
+            self.bound_label.setText(f"TurnBoundError: {repr(ex)}")
+            return
+
+        if bound.error or bound.number_of_ants == 0:
+            self.bound_label.setText(bound.describe())
+            return
 
-        # reset transform
-        painter.resetMatrix()
+        text = (f"<font color=\"#e91e63\">{bound.number_of_paths}</font> disjoint paths"
+                f" at least <font color=\"#e91e63\">{bound.lower_bound}</font> turns")
+        if not self.solution.error:
+            number_of_turns = self.solution.number_of_steps - 1
+            text += f" solution {number_of_turns} <font color=\"#e91e63\">+{bound.gap(number_of_turns)}</font>"
 
-        self.draw_room_names(painter)
+        self.bound_label.setText(text)
+
+    def paintEvent(self, paintEvent):
+        start_time = time.perf_counter()
+
+        with self.profiler.stage('paint'), self.solution.lock:
+            self.paint(paintEvent)
+
+        self.profiler.end_frame()
+
+        # widget is also repainted by Qt itself e.g. on resize
+        self.frame_cost = 0.9 * self.frame_cost + 0.1 * (time.perf_counter() - start_time)
+        if self.adaptive_fps:
+            self.adapt_frame_rate()
+
+    def paint(self, paintEvent):
+        painter = QPainter(self)
+        self.scene.paint(painter)
 
     def mousePressEvent(self, ev):
         left_button_pressed = bool(ev.buttons() & Qt.LeftButton)
 
         if left_button_pressed:
             self.mouse_last_pos = ev.pos()
+            self.camera_moved = True
 
     def mouseMoveEvent(self, ev):  # mouse move only triggered when a mouse button pressed
         dmouse = ev.pos() - self.mouse_last_pos
         self.camera.pos += self.zoom_reverse(QPointF(dmouse))
         self.mouse_last_pos = ev.pos()
+        self.request_redraw()
 
     def wheelEvent(self, ev):  # mouse wheel
         if ev.delta() < 0:
@@ -253,6 +335,8 @@ class View(QOpenGLWidget):  # inherit from QOpenGLWidget to enable opengl backen
 
         # limit camera zoom level
         self.camera.zoom = clamp(self.camera.zoom, MIN_ZOOM, MAX_ZOOM)
+        self.camera_moved = True
+        self.request_redraw()
 
     def keyPressEvent(self, ev):
         if ev.key() == Qt.Key_Space:
@@ -261,83 +345,33 @@ class View(QOpenGLWidget):  # inherit from QOpenGLWidget to enable opengl backen
             self.anim_control.rewind_forward()
         elif ev.key() == Qt.Key_A:
             self.anim_control.rewind_backward()
-
-    def apply_camera(self, painter):
-        mvp = self.mvp()
-        painter.setTransform(mvp)
-
-    def mvp(self):
-        view_center = self.rect().center()
-        mvp = QTransform()
-        mvp.translate(view_center.x(), view_center.y())
-        mvp.scale(self.camera.zoom, self.camera.zoom)
-        mvp.translate(self.camera.pos.x(), self.camera.pos.y())
-        return mvp
+        elif ev.key() == Qt.Key_C:
+            self.scene.collapse_ants = not self.scene.collapse_ants
+        elif ev.key() in (Qt.Key_Plus, Qt.Key_Equal):
+            self.anim_control.speed_up()
+        elif ev.key() == Qt.Key_Minus:
+            self.anim_control.slow_down()
+        elif ev.key() == Qt.Key_S:
+            self.anim_control.toggle_steps_only()
+        elif ev.key() == Qt.Key_P:
+            self.hud_label.setVisible(not self.hud_label.isVisible())
+            self.update_hud()
+
+        self.request_redraw()
 
     def zoom_reverse(self, x):
-        return x/self.camera.zoom
-
-    def draw_links(self, painter):
-        painter.setPen(self.link_pen)
-        painter.drawPath(self.link_layer)
-
-    def draw_solution_paths(self, painter):
-        pen_num = len(self.solution_path_pens)
-        for i, path in enumerate(self.solution_paths):
-            painter.setPen(self.solution_path_pens[i % pen_num])
-            painter.drawPath(path)
-
-    def draw_rooms(self, painter):
-        painter.setPen(self.room_pen)
-        for room in self.map.rooms.values():
-            painter.drawPoint(room.coords.x, room.coords.y)
-
-    def draw_ants(self, painter):
-        if self.solution.error:
-            return
-
-        num_of_pens = len(self.solution_path_pens)
-        for i, ants_on_path in enumerate(self.path_ants.values()):
-            painter.setPen(self.ant_pens[i % num_of_pens])
-            for ant in ants_on_path:
-                painter.drawPoint(QPointF(ant.x, ant.y))
+        return self.scene.zoom_reverse(x)
 
-    def draw_room_names(self, painter):
-        if self.map.error:
-            return
-
-        # manually transform text position to draw text unaffected by zoom
-        painter.setPen(self.text_pen)
-        mvp = self.mvp()
-        rect = QRectF(-100, self.room_size /
-                      2, 200, self.room_size)
-
-        for room in self.solution.all_rooms:
-            screen_c = mvp.map(QPointF(room.coords.x, room.coords.y))
-            painter.drawText(rect.translated(screen_c),
-                             Qt.AlignCenter, room.name)
-
-        start_room = self.map.start_room
-        start_coord = mvp.map(
-            QPointF(start_room.coords.x, start_room.coords.y))
-
-        end_room = self.map.end_room
-        end_coord = mvp.map(QPointF(end_room.coords.x, end_room.coords.y))
 
-        painter.setPen(self.special_text_pen)
-        painter.drawText(rect.translated(start_coord),
-                         Qt.AlignCenter, start_room.name + "\n<start>")
-
-        painter.drawText(rect.translated(
-            end_coord), Qt.AlignCenter, end_room.name + "\n</end>")
-
-
-def init_and_run(map, solution):
+def init_and_run(map, solution, tile_cache_mb=DEFAULT_TILE_CACHE_MB, max_fps=DEFAULT_MAX_FPS, adaptive_fps=False,
+                 profiler=None, turn_bound=None):
     # Create the Qt Application
     app = QApplication()
     # Create and show the form
-    view = View(map, solution)
+    view = View(map, solution, tile_cache_mb=tile_cache_mb, max_fps=max_fps, adaptive_fps=adaptive_fps,
+                profiler=profiler, turn_bound=turn_bound)
     view.resize(800, 600)
     view.show()
     # Run the main Qt loop
     sys.exit(app.exec_())
+
@@ -1,68 +1,305 @@
 #!/usr/bin/env python3
 
-import fileinput
 import sys
-from itertools import tee, islice
-import re
+import atexit
+import argparse
 
-from lemin_vis.map_parser import parse_map_str, Map
-from lemin_vis.solution_parser import parse_solution_str, Solution
-import lemin_vis.view as view
+# only modules without numpy and Qt are imported here so --help and argument errors are instant,
+# parsers are imported once arguments are read, Qt only when a window or image is made
+from lemin_vis.frame_rate import DEFAULT_MAX_FPS
+from lemin_vis.tile_cache import DEFAULT_TILE_CACHE_MB
+from lemin_vis.profiler import Profiler
 
 
-def extract_map_and_solution(input_data):
-    "separates map data string from solution data string when given single map-solution str as input"
-    "return map string and solution strings as tuple"
+def load_input_file(map_solution_filename, jobs=1, cache=None, low_memory=False, profiler=None):
+    """
+        parse whole map-solution file at once, solution is parsed by jobs processes,
+        files parsed before are loaded from cache if given,
+        in low memory mode solution steps are read from memory mapped file when shown,
+        every phase is timed by profiler if given
+    """
+    from lemin_vis.input_reader import read_input, extract_map_and_solution
+    from lemin_vis.map_parser import parse_map_str, Map
+    from lemin_vis.solution_parser import parse_solution_str, Solution
 
-    # find solution begin or ERROR msg in given input str
-    solution_begin = re.search('^L', input_data, re.MULTILINE)
+    profiler = profiler if profiler is not None else Profiler()
 
-    if solution_begin is None:
-        solution_begin = re.search('^ERROR', input_data, re.MULTILINE)
+    if cache is not None:
+        with profiler.phase('cache_load'):
+            cached = cache.load(map_solution_filename)
+        if cached is not None:
+            return cached
 
-    i1, i2 = tee(input_data)
+    with profiler.phase('read_input'):
+        input_data = read_input(map_solution_filename)
 
-    # build two iterators
-    # first from input str start to solution start in that input str
-    # second from solution start til the end of input str
-    i1 = islice(i1, solution_begin.start())
-    i2 = islice(i2, solution_begin.start(), None)
+    try:
+        with profiler.phase('extract'):
+            map_data, solution_data = extract_map_and_solution(input_data)
+    except Exception as ex:
+        print("ExtractionError: could not separate map data from solution data")
+        sys.exit()
 
-    # build strings from iterators
-    map_data = ''.join(i1)
-    solution_data = ''.join(i2)
+    try:
+        with profiler.phase('parse_map'):
+            map = parse_map_str(map_data)
+    except Exception as ex:
+        # if map parsing failed
+        map = Map()
+        map.error = f"MapParseError: {repr(ex)}"
 
-    return (map_data, solution_data)
+    try:
+        with profiler.phase('parse_solution'):
+            if low_memory:
+                from lemin_vis.indexed_solution import open_indexed_solution
+                solution = open_indexed_solution(solution_data, map)
+            elif jobs > 1:
+                from lemin_vis.parallel_parser import parse_solution_parallel
+                solution = parse_solution_parallel(solution_data, map, jobs)
+            else:
+                solution = parse_solution_str(solution_data, map)
+    except Exception as ex:
+        # if solution parsing failed
+        solution = Solution()
+        solution.error = f"SolutionParseError: {repr(ex)}"
 
+    if cache is not None:
+        with profiler.phase('cache_store'):
+            cache.store(map_solution_filename, map, solution)
 
-# read map and solution from standard input
-if len(sys.argv) < 2:
-    input_data = sys.stdin.read()
+    return (map, solution)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="lemin42 visualization")
+    parser.add_argument('map_solution_file', nargs='?',
+                        help="map and solution file, standard input is read if omitted")
+    parser.add_argument('-j', '--jobs', type=int, default=1,
+                        help="render exported frames and snapshot tiles by given number of processes")
+    parser.add_argument('--parse-jobs', type=int, default=1,
+                        help="parse solution file by given number of processes, "
+                             "solutions under 8 MB are parsed by one process anyway")
+    parser.add_argument('--tile-cache', type=int, default=DEFAULT_TILE_CACHE_MB, metavar='MB',
+                        help="memory for cached map tiles in megabytes, 0 draws map without tiles")
+    parser.add_argument('--max-fps', type=int, default=DEFAULT_MAX_FPS,
+                        help="frame rate limit while ants move or camera changes")
+    parser.add_argument('--adaptive-fps', action='store_true',
+                        help="lower frame rate when frames take long to paint")
+    parser.add_argument('--low-memory', action='store_true',
+                        help="do not keep all solution steps in memory, decode them from file when shown")
+    parser.add_argument('--cache-dir', default=None,
+                        help="directory for parsed input files, ~/.cache/lemin_visual by default")
+    parser.add_argument('--no-cache', action='store_true',
+                        help="always parse input file, do not use cache")
+    parser.add_argument('--export', metavar='DIR', default=None,
+                        help="render frames to png files in DIR without opening a window")
+    parser.add_argument('--size', type=frame_size, default=(1280, 720), metavar='WxH',
+                        help="exported frame size in pixels, 1280x720 by default")
+    parser.add_argument('--frames-per-step', type=int, default=1,
+                        help="exported frames from one step to the next, ants move in between")
+    parser.add_argument('--every', type=int, default=1, metavar='N',
+                        help="export every Nth frame only")
+    parser.add_argument('--first-step', type=int, default=0,
+                        help="first exported step")
+    parser.add_argument('--last-step', type=int, default=None,
+                        help="last exported step, last solution step by default")
+    parser.add_argument('--snapshot', metavar='DIR', default=None,
+                        help="render one step as a pyramid of png tiles in DIR, for maps too large for one image")
+    parser.add_argument('--snapshot-zoom', type=float, default=None, metavar='ZOOM',
+                        help="zoom of the deepest snapshot level, map is at least 4096 pixels across by default")
+    parser.add_argument('--svg', metavar='FILE', default=None,
+                        help="write one step as svg vector image, for small maps")
+    parser.add_argument('--step', type=int, default=0,
+                        help="step shown in snapshot and svg")
+    parser.add_argument('--check', action='store_true',
+                        help="validate solution by lem-in rules without a window, "
+                             "print number of turns or first error with its line, exit code is 1 if invalid")
+    parser.add_argument('--bound', action='store_true',
+                        help="with --check, print fewest turns any solution of the map can take, found by max flow")
+    parser.add_argument('--profile', metavar='FILE', default=None,
+                        help="write parse phase and frame stage timings as json to FILE on exit")
+
+    args = parser.parse_args()
+
+    if args.bound and not args.check:
+        parser.error("--bound is printed by --check, window and exports show turn bound anyway")
+    # low memory solution is indexed by one process from input read whole
+    headless = args.export is not None or args.snapshot is not None or args.svg is not None
+    if args.low_memory and args.map_solution_file is None and not headless and not args.check:
+        parser.error("--low-memory needs map_solution_file, standard input is shown while it is being read")
+    if args.low_memory and args.parse_jobs > 1:
+        parser.error("--low-memory and --parse-jobs can not be used together, low memory index is built by one process")
+
+    return args
+
+
+def frame_size(text):
+    "WxH to (width, height)"
+    try:
+        width, height = (int(value) for value in text.lower().split('x'))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"frame size should look like 1280x720, not {text}")
+
+    if width <= 0 or height <= 0:
+        raise argparse.ArgumentTypeError(f"frame size should be positive, not {text}")
+
+    return (width, height)
+
+
+def load_input_stream(stream, profiler=None):
+    """
+        parse map as soon as first solution line arrives,
+        solution steps keep being parsed in background while view is shown
+    """
+    from lemin_vis.input_reader import read_map_data
+    from lemin_vis.map_parser import parse_map_str, Map
+    from lemin_vis.solution_parser import create_solution, Solution
+    from lemin_vis.streaming import stream_solution_in_background
+
+    profiler = profiler if profiler is not None else Profiler()
+
+    try:
+        with profiler.phase('read_map'):
+            map_data, first_solution_line = read_map_data(stream)
+    except Exception as ex:
+        print("ExtractionError: could not separate map data from solution data")
+        sys.exit()
+
+    try:
+        with profiler.phase('parse_map'):
+            map = parse_map_str(map_data)
+    except Exception as ex:
+        # if map parsing failed
+        map = Map()
+        map.error = f"MapParseError: {repr(ex)}"
+
+    try:
+        solution = create_solution(map)
+    except Exception as ex:
+        # if solution parsing failed
+        solution = Solution()
+        solution.error = f"SolutionParseError: {repr(ex)}"
+        return (map, solution)
+
+    stream_solution_in_background(stream, first_solution_line, solution, map)
+
+    return (map, solution)
+
+
+def check_input_file(map_solution_filename, print_bound=False, profiler=None):
+    """
+        print turns of valid solution or its first broken rule, exit with code 1 if solution is invalid,
+        with print_bound turns of valid solution are compared to fewest possible turns
+    """
+    from lemin_vis.input_reader import read_input
+    from lemin_vis.solution_checker import check_input
+
+    profiler = profiler if profiler is not None else Profiler()
+
+    with profiler.phase('check'):
+        result = check_input(read_input(map_solution_filename))
+    name = map_solution_filename or 'stdin'
+
+    if not result.valid:
+        print(f"{name}: KO {result.error}")
+        sys.exit(1)
+
+    print(f"{name}: OK {result.number_of_turns} turns, {result.number_of_moves} moves")
+
+    if print_bound:
+        from lemin_vis.flow_analysis import turn_bound
+
+        with profiler.phase('turn_bound'):
+            bound = turn_bound(result.map)
+        print(f"{name}: {bound.describe(result.number_of_turns)}")
+
+
+def require_qt():
+    "exit with a message if PySide2 is missing, map and solution parsers work without it"
+    try:
+        import PySide2
+    except ImportError:
+        print("ImportError: PySide2 is needed to show or export map, install it with: pip install pyside2",
+              file=sys.stderr)
+        sys.exit(1)
+
+
+def export_images(map, solution, args, profiler):
+    "headless: render frames, snapshot and svg offscreen, widgets are not imported at all"
+    from lemin_vis.headless import export_frames, export_snapshot, export_svg, frame_steps
+
+    if map.error or solution.error:
+        print(map.error or solution.error, file=sys.stderr)
+        sys.exit(1)
+
+    if args.export is not None:
+        steps = frame_steps(solution.number_of_steps, max(args.frames_per_step, 1), max(args.every, 1),
+                            args.first_step, args.last_step)
+        with profiler.phase('export_frames'):
+            export_frames(map, solution, args.export, steps, args.size, args.jobs, args.tile_cache)
+
+    step = min(max(args.step, 0), max(solution.number_of_steps - 1, 0))
+
+    if args.snapshot is not None:
+        with profiler.phase('export_snapshot'):
+            export_snapshot(map, solution, args.snapshot, step, args.snapshot_zoom, args.jobs)
+
+    if args.svg is not None:
+        try:
+            with profiler.phase('export_svg'):
+                export_svg(map, solution, args.svg, step, args.size)
+        except ValueError as ex:
+            print(f"SvgExportError: {ex}", file=sys.stderr)
+            sys.exit(1)
+
+    print_turn_bound(map, solution, profiler)
+
+
+def print_turn_bound(map, solution, profiler):
+    "how far solution is from fewest possible turns by max flow of map"
+    from lemin_vis.flow_analysis import turn_bound
+
+    with profiler.phase('turn_bound'):
+        bound = turn_bound(map)
+
+    print(bound.describe(solution.number_of_steps - 1), file=sys.stderr)
+
+
+args = parse_args()
+headless = args.export is not None or args.snapshot is not None or args.svg is not None
+
+# stats are written however program ends, window close or error exit
+profiler = Profiler()
+if args.profile is not None:
+    atexit.register(profiler.dump, args.profile)
+
+if args.check:
+    # parsers only, neither window nor Qt
+    check_input_file(args.map_solution_file, args.bound, profiler)
+    sys.exit(0)
+
+# window and images need Qt, found out before input is parsed
+require_qt()
+
+if args.map_solution_file is None and not headless:
+    # read map and solution from standard input while it is being written
+    map, solution = load_input_stream(sys.stdin.buffer, profiler)
 else:
-    # read map and solution from file specified as arg
-    map_solution_filename = sys.argv[1]
-
-    with open(map_solution_filename) as map_file:
-        input_data = map_file.read()
-
-try:
-    map_data, solution_data = extract_map_and_solution(input_data)
-except Exception as ex:
-    print("ExtractionError: could not separate map data from solution data")
-    sys.exit()
-
-try:
-    map = parse_map_str(map_data)
-except Exception as ex:
-    # if map parsing failed
-    map = Map()
-    map.error = f"MapParseError: {repr(ex)}"
-
-try:
-    solution = parse_solution_str(solution_data, map)
-except Exception as ex:
-    # if solution parsing failed
-    solution = Solution()
-    solution.error = f"SolutionParseError: {repr(ex)}"
-
-view.init_and_run(map, solution)
+    # read map and solution from file specified as arg, exported input is read whole
+    # low memory solution refers to input file, there is nothing to cache
+    use_cache = args.map_solution_file is not None and not (args.no_cache or args.low_memory)
+    cache = None
+    if use_cache:
+        from lemin_vis.parse_cache import ParseCache
+        cache = ParseCache(args.cache_dir)
+    map, solution = load_input_file(args.map_solution_file, args.parse_jobs, cache, args.low_memory, profiler)
+
+if headless:
+    export_images(map, solution, args, profiler)
+else:
+    import lemin_vis.view as view
+    from lemin_vis.flow_analysis import turn_bound_in_background
+
+    # computed while window is already shown
+    bound = None if map.error else turn_bound_in_background(map)
+    view.init_and_run(map, solution, args.tile_cache, args.max_fps, args.adaptive_fps, profiler, bound)
@@ -0,0 +1,5 @@
+import os
+import glob
+
+EXAMPLES_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'examples')
+EXAMPLE_FILES = sorted(glob.glob(os.path.join(EXAMPLES_DIR, '*.txt')))
@@ -0,0 +1,14 @@
+import os
+
+import pytest
+
+from lemin_vis.input_reader import read_input, extract_map_and_solution
+from lemin_vis.map_parser import parse_map_str
+from tests import EXAMPLE_FILES
+
+
+@pytest.fixture(params=EXAMPLE_FILES, ids=os.path.basename)
+def example(request):
+    "(map, solution text) of every bundled example"
+    map_data, solution_data = extract_map_and_solution(read_input(request.param))
+    return (parse_map_str(map_data), bytes(solution_data).decode())
@@ -0,0 +1,140 @@
+import os
+import random
+from collections import deque
+
+import numpy as np
+import pytest
+
+from lemin_vis.map_parser import parse_map_str
+from lemin_vis.flow_analysis import SplitGraph, turn_bound, turns_along_paths
+from lemin_vis.input_reader import read_input
+from lemin_vis.solution_checker import check_solution, check_input
+from tests import EXAMPLE_FILES
+
+# random maps flow is compared on
+RANDOM_MAPS = 200
+
+
+def reference_max_flow(number_of_rooms, links, start, end):
+    "Edmonds-Karp on rooms split in in and out nodes, every room other than start and end holds one path"
+    capacity = {}
+    neighbours = [set() for _ in range(2 * number_of_rooms)]
+
+    def add_arc(tail, head, arc_capacity):
+        capacity[tail, head] = capacity.get((tail, head), 0) + arc_capacity
+        capacity.setdefault((head, tail), 0)
+        neighbours[tail].add(head)
+        neighbours[head].add(tail)
+
+    for room in range(number_of_rooms):
+        add_arc(2 * room, 2 * room + 1, number_of_rooms if room in (start, end) else 1)
+    for a, b in links:
+        add_arc(2 * a + 1, 2 * b, 1)
+        add_arc(2 * b + 1, 2 * a, 1)
+
+    source, sink = 2 * start + 1, 2 * end
+    flow = 0
+    while True:
+        parents = {source: None}
+        queue = deque([source])
+        while queue and sink not in parents:
+            node = queue.popleft()
+            for head in neighbours[node]:
+                if head not in parents and capacity[node, head] > 0:
+                    parents[head] = node
+                    queue.append(head)
+        if sink not in parents:
+            return flow
+
+        node = sink
+        while parents[node] is not None:
+            capacity[parents[node], node] -= 1
+            capacity[node, parents[node]] += 1
+            node = parents[node]
+        flow += 1
+
+
+def random_map(rng):
+    "(number of rooms, links, start, end) of a small random map"
+    number_of_rooms = rng.randint(2, 30)
+    pairs = [(a, b) for a in range(number_of_rooms) for b in range(a + 1, number_of_rooms)]
+    links = rng.sample(pairs, rng.randint(0, min(len(pairs), 3 * number_of_rooms)))
+    start, end = rng.sample(range(number_of_rooms), 2)
+
+    return (number_of_rooms, links, start, end)
+
+
+def check_paths(paths, links, start, end):
+    "flow paths go from start to end along links and share no room besides start and end"
+    link_set = {frozenset(link) for link in links}
+    inner_rooms = [room for path in paths for room in path[1:-1]]
+
+    assert len(inner_rooms) == len(set(inner_rooms))
+    for path in paths:
+        assert path[0] == start and path[-1] == end
+        assert all(frozenset(link) in link_set for link in zip(path, path[1:]))
+
+
+def test_max_flow_matches_reference():
+    rng = random.Random(42)
+
+    for _ in range(RANDOM_MAPS):
+        number_of_rooms, links, start, end = random_map(rng)
+        # direct start to end link is handled by turn_bound, not by flow
+        links = [link for link in links if set(link) != {start, end}]
+
+        graph = SplitGraph(number_of_rooms, np.array(links, dtype=np.int64).reshape(-1, 2), start, end)
+        graph.max_flow(limit=number_of_rooms)
+
+        assert graph.flow == reference_max_flow(number_of_rooms, links, start, end)
+        paths = graph.paths()
+        assert len(paths) == graph.flow
+        check_paths(paths, links, start, end)
+
+
+def test_bound_is_below_example_solutions(example):
+    map, solution_text = example
+    bound = turn_bound(map)
+    links = map.link_array.tolist()
+
+    assert bound.error is None
+    assert bound.number_of_paths == reference_max_flow(map.number_of_rooms, links,
+                                                       map.start_index, map.end_index)
+    check_paths(bound.paths, links, map.start_index, map.end_index)
+
+    number_of_turns = check_solution(solution_text, map).number_of_turns
+    assert bound.lower_bound <= bound.path_turns
+    assert bound.lower_bound <= number_of_turns
+    assert bound.gap(number_of_turns) >= 0
+
+
+@pytest.mark.parametrize('path', EXAMPLE_FILES, ids=os.path.basename)
+def test_bound_of_checked_input(path):
+    # --check --bound takes map parsed by checker
+    result = check_input(read_input(path))
+    bound = turn_bound(result.map)
+
+    assert result.valid, result.error
+    assert bound.error is None
+    assert bound.describe(result.number_of_turns).startswith(f"{result.number_of_turns} turns, gap +")
+
+
+def test_turns_along_paths():
+    # 3 ants along one path of 2 links: last ant leaves on turn 3 and arrives on turn 4
+    assert turns_along_paths([2], 3) == 4
+    # second path is too long to help
+    assert turns_along_paths([2, 10], 3) == 4
+    assert turns_along_paths([2, 3], 4) == 4
+
+
+def test_maps_without_bound():
+    rooms = "a 0 0\nb 1 1\nc 2 2\n"
+
+    assert "##start" in turn_bound(parse_map_str(f"3\n{rooms}a-c\nc-b\n")).error
+    assert "##end" in turn_bound(parse_map_str(f"3\n##start\n{rooms}a-c\nc-b\n")).error
+
+    unreachable = turn_bound(parse_map_str("3\n##start\na 0 0\n##end\nb 1 1\nc 2 2\na-c\n"))
+    assert "can not be reached" in unreachable.error
+
+    no_ants = turn_bound(parse_map_str("0\n##start\na 0 0\n##end\nb 1 1\nc 2 2\na-c\nc-b\n"))
+    assert no_ants.error is None and no_ants.lower_bound == 0
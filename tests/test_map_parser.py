@@ -0,0 +1,72 @@
+import os
+
+import pytest
+
+from lemin_vis.input_reader import iter_lines, read_input, extract_map_and_solution
+from lemin_vis.map_parser import parse_map_buffer, parse_map_lines, parse_map_str
+from tests import EXAMPLE_FILES
+
+ROOMS = "3\n##start\na 0 0\n# comment\nb 1 1\n##end\nc 2 2\n"
+
+# maps in the format solvers print, bulk parser must not leave them to line parser
+COMMON_MAPS = {
+    'plain': ROOMS + "a-b\nb-c\n",
+    'no_last_line_break': ROOMS + "a-b\nb-c",
+    'comment_tail': ROOMS + "a-b\nb-c\n#> 12 turns\n#> solver comment\n",
+    'empty_line_tail': ROOMS + "a-b\nb-c\n\n",
+    'comments_between_links': ROOMS + "a-b\n#\n# a-c is not a link\nb-c\n",
+    'empty_lines_between_links': ROOMS + "a-b\n\n \t\nb-c\n",
+    'crlf': (ROOMS + "a-b\nb-c\n# comment\n\n").replace("\n", "\r\n"),
+    'repeated_links': ROOMS + "a-b\nb-a\nb-c\na-b\n",
+    'hash_in_name': "2\n##start\na 0 0\n##end\nb# 1 1\na-b#\n",
+    'no_links': ROOMS,
+}
+
+# unusual maps, bulk parser may leave them to line parser but results must be the same
+TRICKY_MAPS = {
+    'command_in_links': ROOMS + "a-b\n##a-c\nb-c\n",
+    'redefined_room': ROOMS + "b 5 5\na-b\nb-c\n",
+    'spaces_around_link': ROOMS + " a-b \nb-c\n",
+    'space_in_link': ROOMS + "a -b\nb-c\n",
+    'two_dashes': ROOMS + "a-b-c\n",
+    'unknown_room': ROOMS + "a-b\nb-x\n",
+    'empty_room_name': ROOMS + "a-\n",
+    'trailing_spaces_in_rooms': "2\n##start\na 0 0 \n##end\nb 1 1\na-b\n",
+}
+
+
+def parse_result(parse, map_text):
+    "comparable fields of parsed map or exception type"
+    try:
+        map = parse(map_text)
+    except Exception as ex:
+        return type(ex)
+
+    return (map.number_of_ants, map.room_names, map.room_coords.tolist(), map.start_index, map.end_index,
+            sorted(map.link_array.tolist()), map.error)
+
+
+@pytest.mark.parametrize('map_text', COMMON_MAPS.values(), ids=COMMON_MAPS.keys())
+def test_bulk_parser_handles_common_maps(map_text):
+    assert parse_map_buffer(map_text.encode()) is not None
+    assert parse_result(lambda text: parse_map_buffer(text.encode()), map_text) == \
+        parse_result(lambda text: parse_map_lines(iter_lines(text)), map_text)
+
+
+@pytest.mark.parametrize('map_text', TRICKY_MAPS.values(), ids=TRICKY_MAPS.keys())
+def test_bulk_and_line_parsers_agree(map_text):
+    line_result = parse_result(lambda text: parse_map_lines(iter_lines(text)), map_text)
+
+    if parse_map_buffer(map_text.encode()) is not None:
+        assert parse_result(lambda text: parse_map_buffer(text.encode()), map_text) == line_result
+    assert parse_result(parse_map_str, map_text) == line_result
+
+
+@pytest.mark.parametrize('path', EXAMPLE_FILES, ids=os.path.basename)
+def test_bulk_parser_handles_examples(path):
+    map_data, _ = extract_map_and_solution(read_input(path))
+    map_text = bytes(map_data).decode()
+
+    assert parse_map_buffer(map_data) is not None
+    assert parse_result(lambda text: parse_map_buffer(text.encode()), map_text) == \
+        parse_result(lambda text: parse_map_lines(iter_lines(text)), map_text)
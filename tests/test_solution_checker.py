@@ -0,0 +1,117 @@
+import random
+
+import pytest
+
+from lemin_vis.map_parser import parse_map_str
+from lemin_vis.solution_checker import check_solution
+
+# broken copies of every example checked against step by step reference
+MUTATIONS_PER_EXAMPLE = 150
+
+
+def reference_check(solution_text, map):
+    "move ants one line at a time, return solution line of the first broken rule or None"
+    start, end = map.start_index, map.end_index
+    links = {frozenset(link) for link in map.link_array.tolist()}
+    rooms = [start] * map.number_of_ants
+    lines = solution_text.rstrip('\n').split('\n')
+
+    for line_number, line in enumerate(lines, 1):
+        moved = set()
+        for token in line.strip().split(' '):
+            if not token.startswith('L') or token.count('-') != 1:
+                return line_number
+            ant, room = token[1:].split('-')
+            if not ant.isdigit() or not 1 <= int(ant) <= map.number_of_ants or room not in map.room_ids:
+                return line_number
+
+            ant, room = int(ant) - 1, map.room_ids[room]
+            if ant in moved or rooms[ant] == end or frozenset((rooms[ant], room)) not in links:
+                return line_number
+            moved.add(ant)
+            rooms[ant] = room
+
+        inner_rooms = [room for room in rooms if room != start and room != end]
+        if len(inner_rooms) != len(set(inner_rooms)):
+            return line_number
+
+    if any(room != end for room in rooms):
+        return len(lines)
+
+    return None
+
+
+def mutate(solution_text, map, rng):
+    "solution with one random change: swapped, dropped or repeated move, wrong ant or room, moved line"
+    lines = solution_text.rstrip('\n').split('\n')
+    line_index = rng.randrange(len(lines))
+    tokens = lines[line_index].split()
+    token_index = rng.randrange(len(tokens))
+    ant, room = tokens[token_index][1:].split('-')
+    kind = rng.choice(['room', 'ant', 'drop', 'repeat', 'swap_lines', 'drop_line', 'garbage'])
+
+    if kind == 'room':
+        tokens[token_index] = f"L{ant}-{rng.choice(map.room_names)}"
+    elif kind == 'ant':
+        tokens[token_index] = f"L{rng.randint(1, map.number_of_ants + 1)}-{room}"
+    elif kind == 'drop' and len(tokens) > 1:
+        del tokens[token_index]
+    elif kind == 'repeat':
+        tokens.insert(token_index, tokens[token_index])
+    elif kind == 'swap_lines' and len(lines) > 1:
+        other = rng.randrange(len(lines))
+        lines[line_index], lines[other] = lines[other], lines[line_index]
+        return '\n'.join(lines) + '\n'
+    elif kind == 'drop_line' and len(lines) > 1:
+        del lines[line_index]
+        return '\n'.join(lines) + '\n'
+    elif kind == 'garbage':
+        tokens[token_index] = rng.choice([f"L{ant}", f"{ant}-{room}", f"L{ant}-{room}-x", f"L{ant}-no_such_room"])
+
+    lines[line_index] = ' '.join(tokens)
+    return '\n'.join(lines) + '\n'
+
+
+def test_examples_are_valid(example):
+    map, solution_text = example
+    result = check_solution(solution_text, map)
+
+    assert result.valid, result.error
+    assert result.number_of_turns == len(solution_text.rstrip('\n').split('\n'))
+    assert result.number_of_moves == len(solution_text.split())
+
+
+def test_first_error_line_matches_reference(example):
+    map, solution_text = example
+    rng = random.Random(42)
+
+    for _ in range(MUTATIONS_PER_EXAMPLE):
+        broken = mutate(solution_text, map, rng)
+        expected_line = reference_check(broken, map)
+        result = check_solution(broken, map)
+
+        assert result.line_number == expected_line, (result.error, broken)
+        assert result.valid == (expected_line is None)
+
+
+@pytest.mark.parametrize('first_line_number', [1, 30])
+def test_error_line_counts_from_first_line(example, first_line_number):
+    map, solution_text = example
+    lines = solution_text.rstrip('\n').split('\n')
+    broken = '\n'.join(lines[:1] + ['L1-no_such_room'] + lines[1:]) + '\n'
+
+    result = check_solution(broken, map, first_line_number)
+
+    assert result.line_number == first_line_number + 1
+    assert 'no_such_room' in result.error
+
+
+@pytest.mark.parametrize('map_text, missing', [
+    ("1\na 0 0\n##end\nb 1 1\na-b\n", "##start"),
+    ("1\n##start\na 0 0\nb 1 1\na-b\n", "##end"),
+])
+def test_map_without_start_or_end(map_text, missing):
+    result = check_solution("L1-b\n", parse_map_str(map_text))
+
+    assert not result.valid
+    assert missing in result.error
@@ -0,0 +1,88 @@
+import numpy as np
+import pytest
+
+from lemin_vis.input_reader import iter_lines
+from lemin_vis.solution_parser import CompactTimeline, parse_solution_str, parse_solution_lines
+from lemin_vis.indexed_solution import open_indexed_solution
+from lemin_vis.parse_cache import ParseCache
+
+# solution text parsed by bulk parser, line by line parser and low memory index
+PARSERS = {
+    'bulk': lambda text, map: parse_solution_str(text, map),
+    'lines': lambda text, map: parse_solution_lines(iter_lines(text), map),
+    'low_memory': lambda text, map: open_indexed_solution(text.encode(), map),
+}
+
+
+def dense_timeline(solution_text, map):
+    "steps x ants rooms table filled line by line, step 0 has all ants in start room"
+    rows = [np.full(map.number_of_ants, map.start_index, dtype=np.int32)]
+
+    for line in solution_text.rstrip('\n').split('\n'):
+        row = rows[-1].copy()
+        for token in line.split():
+            ant, room = token[1:].split('-')
+            row[int(ant) - 1] = map.room_ids[room]
+        rows.append(row)
+
+    return np.array(rows)
+
+
+def ant_room_sequences(timeline):
+    "rooms every ant passes through, waiting in a room is not a new room"
+    return [[rooms[0]] + [room for previous, room in zip(rooms, rooms[1:]) if room != previous]
+            for rooms in timeline.T.tolist()]
+
+
+def with_waiting_ant(solution_text):
+    "solution where an ant moving on first three lines skips its move on the second one and waits"
+    lines = [line.split() for line in solution_text.rstrip('\n').split('\n')]
+    ants = [{token.split('-')[0] for token in line} for line in lines[:3]]
+    ant = min(ants[0] & ants[1] & ants[2])
+
+    lines[1] = [token for token in lines[1] if token.split('-')[0] != ant]
+
+    return '\n'.join(' '.join(line) for line in lines) + '\n'
+
+
+def check_timeline(solution, expected):
+    "every step of solution timeline and interned paths agree with dense table"
+    assert solution.number_of_steps == len(expected)
+    for step in range(len(expected)):
+        assert np.array_equal(solution.timeline[step], expected[step]), step
+
+    ant_paths = [list(solution.paths[path_id]) for path_id in np.asarray(solution.ant_path_ids).tolist()]
+    assert ant_paths == ant_room_sequences(expected)
+    assert len(solution.paths) == len({tuple(path) for path in ant_paths})
+
+
+@pytest.mark.parametrize('parse', list(PARSERS.values()), ids=list(PARSERS))
+def test_compact_timeline_matches_dense(example, parse):
+    map, solution_text = example
+    solution = parse(solution_text, map)
+
+    # ants of bundled examples never wait, rows are computed from paths
+    assert isinstance(solution.timeline, CompactTimeline)
+    check_timeline(solution, dense_timeline(solution_text, map))
+
+
+@pytest.mark.parametrize('parse', list(PARSERS.values()), ids=list(PARSERS))
+def test_waiting_ants_keep_dense_timeline(example, parse):
+    map, solution_text = example
+    solution_text = with_waiting_ant(solution_text)
+    solution = parse(solution_text, map)
+
+    assert not isinstance(solution.timeline, CompactTimeline)
+    check_timeline(solution, dense_timeline(solution_text, map))
+
+
+def test_cache_restores_timeline(example, tmp_path):
+    map, solution_text = example
+    input_path = tmp_path / 'input.txt'
+    input_path.write_text(solution_text)
+    cache = ParseCache(str(tmp_path / 'cache'))
+
+    cache.store(str(input_path), map, parse_solution_str(solution_text, map))
+    _, cached_solution = cache.load(str(input_path))
+
+    check_timeline(cached_solution, dense_timeline(solution_text, map))